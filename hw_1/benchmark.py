@@ -0,0 +1,181 @@
+import io
+import os
+import time
+import tarfile
+import argparse
+import tempfile
+import tracemalloc
+from typing import List, Optional
+from dataclasses import dataclass
+
+from src.vfs import VirtualFileSystem, _entry_name
+from src.command_engine import CommandEngine
+from src.logger import Logger, DURABILITY_BATCH
+from src.metrics import CommandMetrics
+from src.common.file import File
+from src.common.file_tree import FileTree
+
+
+@dataclass
+class LegacyFile:
+    # File record as it was stored before: __dict__ per instance and full path as name
+    name: str
+    content: bytes
+    is_directory: bool
+    modified_time: float
+    offset: Optional[int] = None
+    size: int = 0
+
+
+def synthetic_paths(entries: int, fanout: int = 100):
+    """Yield (path, is_directory) for a tree with `fanout` files per directory."""
+    yield "/", True
+    directory = ""
+    for i in range(entries - 1):
+        if i % (fanout + 1) == 0:
+            directory = f"/dir{i // (fanout + 1):06d}"
+            yield directory, True
+        else:
+            yield f"{directory}/file{i:07d}.txt", False
+
+
+def measure(build, entries: int) -> float:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    storage = build(entries)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del storage
+    return (after - before) / entries
+
+
+def build_legacy(entries: int):
+    files = {}
+    for path, is_directory in synthetic_paths(entries):
+        files[path] = LegacyFile(path, b"", is_directory, 1700000000.0 + len(files),
+                                 offset=None if is_directory else 512 * len(files), size=1024)
+    return files
+
+
+def build_tree(entries: int):
+    files = FileTree()
+    for path, is_directory in synthetic_paths(entries):
+        files[path] = File(_entry_name(path), b"", is_directory, 1700000000.0 + len(files),
+                           offset=None if is_directory else 512 * len(files), size=1024)
+    return files
+
+
+def build_tar(tar_path: str, entries: int, file_size: int = 0):
+    data = b"x" * file_size
+    with tarfile.open(tar_path, "w") as tar:
+        for path, is_directory in synthetic_paths(entries):
+            if path == "/":
+                continue
+            info = tarfile.TarInfo(path.lstrip("/"))
+            info.mtime = 1700000000
+            if is_directory:
+                info.type = tarfile.DIRTYPE
+                tar.addfile(info)
+            else:
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+
+
+def timed_load(tar_path: str, **kwargs) -> float:
+    fs = VirtualFileSystem()
+    start = time.perf_counter()
+    fs.load(tar_path, **kwargs)
+    elapsed = time.perf_counter() - start
+    fs.close()
+    return elapsed
+
+
+def loaded_memory(tar_path: str) -> int:
+    tracemalloc.start()
+    fs = VirtualFileSystem()
+    fs.load(tar_path, lazy=True)
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    fs.close()
+    return used
+
+
+def command_script(entries: int, iterations: int, fanout: int = 100) -> List[str]:
+    directories = max(1, entries // (fanout + 1))
+    commands = []
+    for i in range(iterations):
+        directory = f"/dir{(i * 7919) % directories:06d}"
+        commands += [
+            "ls /",
+            f"ls {directory}",
+            f"cd {directory}",
+            "cd /",
+            "find / -name *5.txt -limit 100",
+            f"find {directory} 9",
+        ]
+    # Removals last, each one takes a different directory
+    commands += [f"rm /dir{(i * 7919) % directories:06d}" for i in range(iterations)]
+    return commands
+
+
+def run_suite(sizes: List[int], iterations: int):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for entries in sizes:
+            tar_path = os.path.join(tmp_dir, f"vfs_{entries}.tar")
+            build_tar(tar_path, entries)
+
+            print(f"== {entries} entries ({os.path.getsize(tar_path) / 2**20:.1f} MiB tar)")
+            print(f"load eager:          {timed_load(tar_path) * 1000:10.1f} ms")
+            print(f"load lazy:           {timed_load(tar_path, lazy=True) * 1000:10.1f} ms")
+            print(f"load + build index:  {timed_load(tar_path, use_index=True) * 1000:10.1f} ms")
+            print(f"load from index:     {timed_load(tar_path, use_index=True) * 1000:10.1f} ms")
+            print(f"memory (lazy):       {loaded_memory(tar_path) / entries:10.1f} bytes/entry")
+
+            metrics = CommandMetrics()
+            fs = VirtualFileSystem(metrics)
+            fs.load(tar_path, lazy=True)
+            engine = CommandEngine("bench", fs, Logger(os.path.join(tmp_dir, "log.csv"), "bench",
+                                                       durability=DURABILITY_BATCH))
+            for command in command_script(entries, iterations):
+                for _ in engine.execute(command):
+                    pass
+                if command.startswith("cd "):
+                    engine.complete(f"ls {fs.current_directory}/file00")
+            engine.logger.close()
+            fs.close()
+
+            for row in metrics.rows()[1:]:
+                operation, count, _, mean_ms, max_ms = row[:5]
+                if operation != "load":
+                    print(f"{operation:<10} x{count:<6} mean {mean_ms:>9} ms  max {max_ms:>9} ms")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="VFS benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    memory = subparsers.add_parser("memory", help="Per-entry memory of the storage backends")
+    memory.add_argument('--entries', type=int, default=100000, help="Number of synthetic entries")
+
+    suite = subparsers.add_parser("suite", help="Load time, memory and command latency on synthetic tars")
+    suite.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                       help="Number of entries of each generated archive")
+    suite.add_argument('--iterations', type=int, default=50, help="Repetitions of the command script")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.benchmark == "suite":
+        run_suite(args.sizes, args.iterations)
+        return
+
+    legacy = measure(build_legacy, args.entries)
+    tree = measure(build_tree, args.entries)
+    print(f"entries: {args.entries}")
+    print(f"dict of dataclass records: {legacy:8.1f} bytes/entry")
+    print(f"array-backed file tree:    {tree:8.1f} bytes/entry")
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,69 @@
+import os
+import sys
 import argparse
 
-from src.shell_emu import ShellEmulator
+from src.vfs import VirtualFileSystem
+from src.command_engine import CommandEngine
+from src.metrics import CommandMetrics
+from src.logger import Logger, DURABILITY_BATCH, DURABILITY_COMMAND
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Shell Emulator")
     parser.add_argument('--username', required=True, help="Username for the shell prompt")
     parser.add_argument('--vfs', required=True, help="Path to the virtual file system tar archive")
     parser.add_argument('--log', required=True, help="Path to the log file")
+    parser.add_argument('--layer', action='append', default=[],
+                        help="Read-only archive stacked on top of --vfs, may be repeated")
+    parser.add_argument('--lazy', action='store_true',
+                        help="Read only tar headers on startup, load file contents on demand")
+    parser.add_argument('--index', action='store_true',
+                        help="Keep a precomputed index next to the archive for fast startup")
+    parser.add_argument('--log-durability', choices=[DURABILITY_COMMAND, DURABILITY_BATCH],
+                        default=DURABILITY_COMMAND,
+                        help="Write the log after every command or in background batches")
+    parser.add_argument('--log-max-bytes', type=int, default=0,
+                        help="Rotate the log file once it grows past this size (0 disables rotation)")
+    parser.add_argument('--script',
+                        help="Run commands from this file ('-' for stdin) without the GUI, output goes to stdout")
+    parser.add_argument('--scrollback', type=int, default=10000,
+                        help="Maximum number of output lines kept in the shell window")
+    parser.add_argument('--metrics', action='store_true',
+                        help="Record per-operation latencies and save them as CSV next to the log")
     return parser.parse_args()
 
 
 def main():
     args = parse_args()
-    app = ShellEmulator(args.username, args.vfs, args.log)
-    app.mainloop()
+    metrics = CommandMetrics() if args.metrics else None
+    layers = []
+    for tar_path in [args.vfs] + args.layer:
+        layer = VirtualFileSystem(metrics)
+        layer.load(tar_path, lazy=args.lazy, use_index=args.index)
+        layers.append(layer)
+    if args.layer:
+        fs = VirtualFileSystem.overlay(layers)
+        fs.metrics = metrics
+    else:
+        fs = layers[0]
+    logger = Logger(args.log, args.username, durability=args.log_durability, max_bytes=args.log_max_bytes)
+    engine = CommandEngine(args.username, fs, logger)
+
+    try:
+        if args.script == '-':
+            engine.run_script(sys.stdin, sys.stdout)
+        elif args.script:
+            with open(args.script) as script:
+                engine.run_script(script, sys.stdout)
+        else:
+            # Tk is only needed for the interactive shell
+            from src.shell_emu import ShellEmulator
+            ShellEmulator(engine, scrollback=args.scrollback).mainloop()
+    finally:
+        logger.close()
+        for layer in layers:
+            layer.close()
+        if metrics is not None:
+            metrics.export_csv(os.path.splitext(args.log)[0] + "_metrics.csv")
 
 if __name__ == "__main__":
     main()
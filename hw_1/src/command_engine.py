@@ -0,0 +1,133 @@
+import os
+import re
+from typing import Iterable, List, TextIO, Tuple
+
+from src.logger import Logger
+from src.vfs import VirtualFileSystem
+
+COMMANDS = ["cd", "exit", "find", "ls", "rm"]
+
+class CommandEngine:
+    """
+    Parses and runs shell commands against the VFS, independent of any UI.
+    Front ends only print what `execute` returns.
+    """
+
+    def __init__(self, username: str, fs: VirtualFileSystem, logger: Logger):
+        self.username = username
+        self.fs = fs
+        self.logger = logger
+        # Cleared by `exit`
+        self.running = True
+
+    def prompt(self) -> str:
+        return f"{self.username}:{self.fs.current_directory}$ "
+
+    def execute(self, command: str) -> Iterable[str]:
+        """
+        Run one command line and return its output lines.
+        Side effects happen right away, long outputs (find) are produced lazily.
+        """
+        parts = command.split()
+        if not parts:
+            return []
+
+        cmd = parts[0]
+        args = parts[1:]
+
+        # Log the command
+        self.logger.log(cmd, " ".join(args))
+
+        if cmd == "exit":
+            self.running = False
+            return []
+        elif cmd == "ls":
+            path = args[0] if args else ""
+            return ["  ".join(self.fs.ls(path))]
+        elif cmd == "cd":
+            if not args:
+                return ["cd: missing directory argument"]
+            elif not self.fs.cd(args[0]):
+                return [f"cd: {args[0]}: No such directory"]
+            return []
+        elif cmd == "rm":
+            if not args:
+                return ["rm: missing operand"]
+            elif not self.fs.rm(args[0]):
+                return [f"rm: {args[0]}: No such file or directory"]
+            return []
+        elif cmd == "find":
+            options = self.parse_find_args(args)
+            if isinstance(options, str):
+                return [f"find: {options}"]
+            try:
+                return self.fs.iter_find(**options)
+            except re.error as e:
+                return [f"find: invalid pattern: {e}"]
+        return [f"command not found: {cmd}"]
+
+    def parse_find_args(self, args: List[str]):
+        """
+        find [-name GLOB] [-maxdepth N] [-limit N] PATH [PATTERN]
+        Returns keyword arguments for VirtualFileSystem.iter_find or an error message.
+        """
+        options = {"glob": False, "max_depth": None, "limit": None}
+        positional = []
+        args = iter(args)
+        for arg in args:
+            if arg == "-name":
+                options["pattern"] = next(args, None)
+                options["glob"] = True
+                if options["pattern"] is None:
+                    return "-name: missing pattern"
+            elif arg in ("-maxdepth", "-limit"):
+                value = next(args, "")
+                if not value.isdigit():
+                    return f"{arg}: invalid number"
+                options["max_depth" if arg == "-maxdepth" else "limit"] = int(value)
+            else:
+                positional.append(arg)
+
+        if options["glob"]:
+            if len(positional) != 1:
+                return "missing arguments" if not positional else "too many arguments"
+            options["path"] = positional[0]
+        else:
+            if len(positional) < 2:
+                return "missing arguments"
+            options["path"], options["pattern"] = positional[:2]
+        return options
+
+    def complete(self, line: str) -> Tuple[str, List[str]]:
+        """
+        Complete the last word of `line`: a command name for the first word,
+        a path otherwise. Returns the completed line and all candidates.
+        """
+        head, sep, word = line.rpartition(" ")
+        if sep:
+            candidates = self.fs.complete(word)
+        else:
+            candidates = [cmd for cmd in COMMANDS if cmd.startswith(word)]
+        if not candidates:
+            return line, []
+
+        # Candidates are sorted, so the first and last share the common prefix
+        completed = os.path.commonprefix([candidates[0], candidates[-1]])
+        if len(candidates) == 1:
+            completed += "/" if sep and self.fs.is_directory(completed) else " "
+        return head + sep + completed, candidates
+
+    def run_script(self, script: TextIO, output: TextIO) -> int:
+        """Run commands line by line until `exit` or end of input, return how many ran."""
+        executed = 0
+        for line in script:
+            command = line.strip()
+            if not command or command.startswith("#"):
+                continue
+            for out_line in self.execute(command):
+                output.write(f"{out_line}\n")
+            executed += 1
+            if not self.running:
+                break
+        output.flush()
+        return executed
@@ -1,8 +1,13 @@
+from typing import Optional
 from dataclasses import dataclass
 
-@dataclass
+@dataclass(slots=True)
 class File:
+    # Base name of the entry, the full path is the key it is stored under
     name: str
     content: bytes
     is_directory: bool
     modified_time: float
+    # Position of the content inside the source archive for lazily loaded files
+    offset: Optional[int] = None
+    size: int = 0
@@ -0,0 +1,253 @@
+from array import array
+from bisect import bisect_left, insort
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.common.file import File
+
+# Per-entry flag bits
+_PRESENT = 1      # entry holds a file, otherwise it only keeps orphaned children alive
+_DIRECTORY = 2
+_HAS_OFFSET = 4
+
+_ROOT = 0
+
+
+def join_path(path: str, name: str) -> str:
+    return path + name if path.endswith("/") else path + "/" + name
+
+
+class FileTree(MutableMapping):
+    """
+    Absolute path -> File mapping backed by a directory tree.
+
+    Each entry is an integer id into parallel arrays (name, parent
+    id, flags, mtime, content offset and size), and every directory keeps a
+    name -> id map of its children. Listing a directory or removing a subtree
+    only touches that subtree, and full paths are never stored: lookups walk
+    the path components from the root. `File` objects are built on access,
+    so changing a returned record does not change the tree.
+    """
+
+    def __init__(self, files: Optional[Dict[str, File]] = None):
+        self._names: List[str] = [""]
+        self._parents = array('l', [-1])
+        self._flags = array('B', [0])
+        self._mtimes = array('d', [0.0])
+        self._offsets = array('q', [0])
+        self._sizes = array('q', [0])
+        # Contents of eagerly loaded files, empty ones are not stored
+        self._contents: Dict[int, bytes] = {}
+        self._children: Dict[int, Dict[str, int]] = {}
+        # Sorted names of present children, built by the first prefix query
+        # on a directory and kept up to date from then on
+        self._sorted: Dict[int, List[str]] = {}
+        self._free: List[int] = []
+        self._size = 0
+        if files:
+            for path, file in files.items():
+                self[path] = file
+
+    def _find_id(self, path: str) -> Optional[int]:
+        node = _ROOT
+        for part in path.split("/"):
+            if not part:
+                continue
+            children = self._children.get(node)
+            if children is None:
+                return None
+            node = children.get(part)
+            if node is None:
+                return None
+        return node
+
+    def _new_id(self, name: str, parent: int) -> int:
+        if self._free:
+            node = self._free.pop()
+            self._names[node] = name
+            self._parents[node] = parent
+            return node
+
+        self._names.append(name)
+        self._parents.append(parent)
+        self._flags.append(0)
+        self._mtimes.append(0.0)
+        self._offsets.append(0)
+        self._sizes.append(0)
+        return len(self._names) - 1
+
+    def _get_id(self, path: str) -> int:
+        node = _ROOT
+        for part in path.split("/"):
+            if not part:
+                continue
+            children = self._children.setdefault(node, {})
+            child = children.get(part)
+            if child is None:
+                child = self._new_id(part, node)
+                children[self._names[child]] = child
+            node = child
+        return node
+
+    def _release(self, node: int) -> None:
+        self._flags[node] = 0
+        self._names[node] = ""
+        self._contents.pop(node, None)
+        self._sorted.pop(node, None)
+        self._free.append(node)
+
+    def _sorted_add(self, node: int) -> None:
+        names = self._sorted.get(self._parents[node])
+        if names is not None:
+            insort(names, self._names[node])
+
+    def _sorted_discard(self, node: int) -> None:
+        names = self._sorted.get(self._parents[node])
+        if names is not None:
+            del names[bisect_left(names, self._names[node])]
+
+    def _unlink(self, node: int) -> None:
+        # Drop placeholder ancestors that no longer hold anything
+        while node != _ROOT and not self._flags[node] & _PRESENT and not self._children.get(node):
+            parent = self._parents[node]
+            self._children.pop(node, None)
+            del self._children[parent][self._names[node]]
+            self._release(node)
+            node = parent
+
+    def _record(self, node: int) -> File:
+        flags = self._flags[node]
+        return File(
+            self._names[node] or "/",
+            self._contents.get(node, b""),
+            bool(flags & _DIRECTORY),
+            self._mtimes[node],
+            offset=self._offsets[node] if flags & _HAS_OFFSET else None,
+            size=self._sizes[node],
+        )
+
+    def __getitem__(self, path: str) -> File:
+        node = self._find_id(path)
+        if node is None or not self._flags[node] & _PRESENT:
+            raise KeyError(path)
+        return self._record(node)
+
+    def __setitem__(self, path: str, file: File) -> None:
+        node = self._get_id(path)
+        if not self._flags[node] & _PRESENT:
+            self._size += 1
+            if node != _ROOT:
+                self._sorted_add(node)
+
+        flags = _PRESENT
+        if file.is_directory:
+            flags |= _DIRECTORY
+        if file.offset is not None:
+            flags |= _HAS_OFFSET
+            self._offsets[node] = file.offset
+        self._flags[node] = flags
+        self._mtimes[node] = file.modified_time
+        self._sizes[node] = file.size
+        if file.content:
+            self._contents[node] = file.content
+        else:
+            self._contents.pop(node, None)
+
+    def __delitem__(self, path: str) -> None:
+        node = self._find_id(path)
+        if node is None or not self._flags[node] & _PRESENT:
+            raise KeyError(path)
+        if node != _ROOT:
+            self._sorted_discard(node)
+        self._flags[node] = 0
+        self._contents.pop(node, None)
+        self._size -= 1
+        self._unlink(node)
+
+    def __contains__(self, path) -> bool:
+        node = self._find_id(path)
+        return node is not None and bool(self._flags[node] & _PRESENT)
+
+    def __iter__(self) -> Iterator[str]:
+        return (path for path, _ in self.walk("/"))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def children(self, path: str) -> List[str]:
+        """Names of the entries directly inside `path`."""
+        node = self._find_id(path)
+        if node is None or node not in self._children:
+            return []
+        flags = self._flags
+        return [name for name, child in self._children[node].items() if flags[child] & _PRESENT]
+
+    def sorted_children(self, path: str, prefix: str = "") -> List[str]:
+        """Names inside `path` starting with `prefix`, in order, found by binary search."""
+        node = self._find_id(path)
+        if node is None:
+            return []
+        names = self._sorted.get(node)
+        if names is None:
+            names = self._sorted[node] = sorted(self.children(path))
+        if not prefix:
+            return list(names)
+        start = bisect_left(names, prefix)
+        # Every name with the prefix sorts before prefix + the highest code point
+        end = bisect_left(names, prefix + "\U0010ffff", start)
+        return names[start:end]
+
+    def walk(self, path: str, sort: bool = False,
+             max_depth: Optional[int] = None) -> Iterator[Tuple[str, File]]:
+        """
+        Yield (path, file) for `path` and everything below it, depth first.
+        With `sort` siblings are visited in name order; `max_depth` limits
+        how far below `path` the walk goes.
+        """
+        node = self._find_id(path)
+        if node is None:
+            return
+        stack = [(path, node, 0)]
+        while stack:
+            current_path, current, depth = stack.pop()
+            if self._flags[current] & _PRESENT:
+                yield current_path, self._record(current)
+            children = self._children.get(current)
+            if not children or (max_depth is not None and depth >= max_depth):
+                continue
+            names = sorted(children, reverse=True) if sort else children
+            for name in names:
+                stack.append((join_path(current_path, name), children[name], depth + 1))
+
+    def remove_subtree(self, path: str) -> int:
+        """Remove `path` and all entries below it, return how many were removed."""
+        node = self._find_id(path)
+        if node is None:
+            return 0
+
+        name = self._names[node]
+        if node != _ROOT and self._flags[node] & _PRESENT:
+            self._sorted_discard(node)
+        removed = 0
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if self._flags[current] & _PRESENT:
+                removed += 1
+            children = self._children.pop(current, None)
+            if children:
+                stack.extend(children.values())
+            if current != _ROOT:
+                self._release(current)
+        self._size -= removed
+
+        if node == _ROOT:
+            # The root id stays allocated, only its entry goes away
+            self._flags[_ROOT] = 0
+            self._contents.pop(_ROOT, None)
+            self._sorted.pop(_ROOT, None)
+        else:
+            parent = self._parents[node]
+            del self._children[parent][name]
+            self._unlink(parent)
+        return removed
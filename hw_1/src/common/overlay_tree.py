@@ -0,0 +1,125 @@
+import heapq
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from src.common.file import File
+from src.common.file_tree import FileTree, join_path
+
+
+def _ancestors(path: str) -> Iterator[str]:
+    """`path` itself and every directory above it, up to the root."""
+    yield path
+    while path not in ("/", ""):
+        path = path.rsplit("/", 1)[0] or "/"
+        yield path
+
+
+class OverlayTree(MutableMapping):
+    """
+    Copy-on-write view over read-only lower FileTrees.
+
+    Lower layers are never modified, so several overlays can share them.
+    New entries go to a private upper FileTree, and removals of lower
+    entries are recorded as whiteouts that hide the path and everything
+    below it in the lower layers. Lower layers are listed bottom first,
+    a higher layer shadows the same path in the ones below it.
+    """
+
+    def __init__(self, lowers: List[FileTree]):
+        self.lowers = lowers
+        self.upper = FileTree()
+        self.whiteouts: Set[str] = set()
+
+    def _hidden(self, path: str) -> bool:
+        if not self.whiteouts:
+            return False
+        return any(p in self.whiteouts for p in _ancestors(path))
+
+    def find_layer(self, path: str) -> Optional[int]:
+        """Index of the lower layer that provides `path`, None if it comes from the upper one."""
+        if path in self.upper:
+            return None
+        if self._hidden(path):
+            raise KeyError(path)
+        for i in range(len(self.lowers) - 1, -1, -1):
+            if path in self.lowers[i]:
+                return i
+        raise KeyError(path)
+
+    def _in_lower(self, path: str) -> bool:
+        return not self._hidden(path) and any(path in lower for lower in self.lowers)
+
+    def __getitem__(self, path: str) -> File:
+        layer = self.find_layer(path)
+        return self.upper[path] if layer is None else self.lowers[layer][path]
+
+    def __setitem__(self, path: str, file: File) -> None:
+        self.upper[path] = file
+
+    def __delitem__(self, path: str) -> None:
+        if path not in self:
+            raise KeyError(path)
+        if path in self.upper:
+            del self.upper[path]
+        if self._in_lower(path):
+            self.whiteouts.add(path)
+
+    def __contains__(self, path) -> bool:
+        return path in self.upper or self._in_lower(path)
+
+    def __iter__(self) -> Iterator[str]:
+        return (path for path, _ in self.walk("/"))
+
+    def __len__(self) -> int:
+        # Merged size isn't tracked, counting walks the whole view
+        return sum(1 for _ in self)
+
+    def children(self, path: str) -> List[str]:
+        """Names of the entries directly inside `path`, merged across layers."""
+        names: Dict[str, None] = dict.fromkeys(self.upper.children(path))
+        if not self._hidden(path):
+            for lower in self.lowers:
+                for name in lower.children(path):
+                    if name not in names and join_path(path, name) not in self.whiteouts:
+                        names[name] = None
+        return list(names)
+
+    def sorted_children(self, path: str, prefix: str = "") -> List[str]:
+        """Names inside `path` starting with `prefix`, in order, merged across layers."""
+        layers = [self.upper.sorted_children(path, prefix)]
+        if not self._hidden(path):
+            for lower in self.lowers:
+                layers.append([
+                    name for name in lower.sorted_children(path, prefix)
+                    if join_path(path, name) not in self.whiteouts
+                ])
+        names = []
+        for name in heapq.merge(*layers):
+            if not names or names[-1] != name:
+                names.append(name)
+        return names
+
+    def walk(self, path: str, sort: bool = False,
+             max_depth: Optional[int] = None) -> Iterator[Tuple[str, File]]:
+        """Same as FileTree.walk, over the merged view."""
+        if path not in self:
+            return
+        stack = [(path, 0)]
+        while stack:
+            current_path, depth = stack.pop()
+            yield current_path, self[current_path]
+            if max_depth is not None and depth >= max_depth:
+                continue
+            names = self.children(current_path)
+            if sort:
+                names.sort(reverse=True)
+            for name in names:
+                stack.append((join_path(current_path, name), depth + 1))
+
+    def remove_subtree(self, path: str) -> int:
+        """Remove `path` and all entries below it, return how many were removed."""
+        removed = sum(1 for _ in self.walk(path))
+        self.upper.remove_subtree(path)
+        if self._in_lower(path):
+            self.whiteouts.add(path)
+        return removed
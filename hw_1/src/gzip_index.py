@@ -0,0 +1,138 @@
+import io
+import zlib
+from bisect import bisect_right
+from typing import List
+
+GZIP_MAGIC = b"\x1f\x8b"
+# Uncompressed distance between access points, each one keeps a copy of the
+# inflate state (about 40 KiB with its 32 KiB window)
+DEFAULT_SPAN = 4 << 20
+READ_SIZE = 64 << 10
+# zlib wbits for a gzip header and trailer
+GZIP_WBITS = 31
+
+
+def is_gzip(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(2) == GZIP_MAGIC
+
+
+class IndexedGzipFile(io.RawIOBase):
+    """
+    Seekable reader over a gzip file with zran-style access points.
+
+    While the stream is decompressed, the inflate state is saved roughly
+    every `span` uncompressed bytes. Reading at an arbitrary offset then
+    only decompresses from the nearest access point before it instead of
+    from the start of the file. Access points are built as the stream is
+    first read, so the one pass tarfile makes over the headers indexes
+    the whole archive. Concatenated gzip members are supported.
+    """
+
+    def __init__(self, path: str, span: int = DEFAULT_SPAN):
+        super().__init__()
+        self.span = span
+        self._file = open(path, 'rb')
+        # Access points: uncompressed offset, compressed offset, inflate state
+        self._points_out: List[int] = []
+        self._points_in: List[int] = []
+        self._points_state: List = []
+        # Furthest uncompressed offset covered by access points so far
+        self._indexed_to = 0
+
+        self._position = 0
+        self._restore(0, 0, zlib.decompressobj(GZIP_WBITS))
+        self._add_point()
+
+    def _restore(self, out_pos: int, in_pos: int, state):
+        self._file.seek(in_pos)
+        self._in_pos = in_pos
+        self._decomp = state
+        # Last decompressed chunk and the uncompressed offset it starts at
+        self._chunk = b""
+        self._chunk_start = out_pos
+
+    def _add_point(self):
+        out_pos = self._chunk_start + len(self._chunk)
+        self._points_out.append(out_pos)
+        self._points_in.append(self._in_pos)
+        self._points_state.append(self._decomp.copy())
+        self._indexed_to = out_pos
+
+    def _advance(self) -> bool:
+        """Decompress the next chunk, returns False at the end of the stream."""
+        output = b""
+        while not output:
+            data = self._file.read(READ_SIZE)
+            if self._decomp.eof:
+                if not data:
+                    return False
+                # Next gzip member
+                self._decomp = zlib.decompressobj(GZIP_WBITS)
+            elif not data:
+                raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+            self._in_pos += len(data)
+            output = self._decomp.decompress(data)
+            while self._decomp.eof and self._decomp.unused_data:
+                leftover = self._decomp.unused_data
+                self._decomp = zlib.decompressobj(GZIP_WBITS)
+                output += self._decomp.decompress(leftover)
+
+        self._chunk_start += len(self._chunk)
+        self._chunk = output
+        chunk_end = self._chunk_start + len(output)
+        if chunk_end > self._indexed_to and chunk_end - self._points_out[-1] >= self.span:
+            self._add_point()
+        return True
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        point = bisect_right(self._points_out, offset) - 1
+        point_out = self._points_out[point]
+        if offset < self._chunk_start or point_out > self._chunk_start + len(self._chunk):
+            # Behind the current chunk, or an access point is closer than it
+            self._restore(point_out, self._points_in[point], self._points_state[point].copy())
+
+        result = bytearray()
+        while len(result) < size:
+            start = offset - self._chunk_start
+            if 0 <= start < len(self._chunk):
+                piece = self._chunk[start:start + size - len(result)]
+                result += piece
+                offset += len(piece)
+            elif not self._advance():
+                break
+        return bytes(result)
+
+    def __getitem__(self, key: slice) -> bytes:
+        return self.read_at(key.start, key.stop - key.start)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            while self._advance():
+                pass
+            offset += self._chunk_start + len(self._chunk)
+        self._position = offset
+        return offset
+
+    def readinto(self, buffer) -> int:
+        data = self.read_at(self._position, len(buffer))
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+            self._points_state.clear()
+        super().close()
@@ -1,22 +1,97 @@
+import os
 import csv
+import atexit
+import threading
 from datetime import datetime
+from typing import List
+
+DURABILITY_COMMAND = "command"  # every command reaches the file before log() returns
+DURABILITY_BATCH = "batch"      # commands are buffered and written by a background thread
+
+HEADER = ['timestamp', 'username', 'command', 'arguments']
 
 class Logger:
-    def __init__(self, log_path: str, username: str):
+    def __init__(self, log_path: str, username: str, durability: str = DURABILITY_COMMAND,
+                 flush_interval: float = 1.0, buffer_size: int = 100,
+                 max_bytes: int = 0, backup_count: int = 1):
+        if durability not in (DURABILITY_COMMAND, DURABILITY_BATCH):
+            raise ValueError(f"Unknown log durability: {durability}")
+
         self.log_path = log_path
         self.username = username
-        
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        # Rotate once the file grows past max_bytes, 0 disables rotation
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+        self._buffer: List[List[str]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
         # Create/clear log file
-        with open(log_path, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['timestamp', 'username', 'command', 'arguments'])
-    
+        self._open()
+
+        self._thread = None
+        if durability == DURABILITY_BATCH:
+            self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _open(self):
+        self._file = open(self.log_path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(HEADER)
+        self._file.flush()
+
     def log(self, command: str, arguments: str = ""):
-        with open(self.log_path, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                self.username,
-                command,
-                arguments
-            ])
\ No newline at end of file
+        row = [
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            self.username,
+            command,
+            arguments
+        ]
+        with self._lock:
+            self._buffer.append(row)
+            if self.durability == DURABILITY_COMMAND or len(self._buffer) >= self.buffer_size:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer or self._file.closed:
+            return
+        self._writer.writerows(self._buffer)
+        self._buffer.clear()
+        self._file.flush()
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self._file.close()
+        # log.csv -> log.csv.1 -> log.csv.2 ..., the oldest backup is dropped
+        for i in range(self.backup_count - 1, 0, -1):
+            older = f"{self.log_path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.log_path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.log_path, f"{self.log_path}.1")
+        self._open()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            self._flush_locked()
+            if not self._file.closed:
+                self._file.close()
+        atexit.unregister(self.close)
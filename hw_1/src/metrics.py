@@ -0,0 +1,85 @@
+import csv
+from functools import wraps
+from time import perf_counter
+from typing import Dict, Iterator, List
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = [1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0, float("inf")]
+
+class OperationStats:
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets: List[int] = [0] * len(BUCKETS)
+
+class CommandMetrics:
+    """Counts and latency histograms per VFS operation."""
+
+    def __init__(self):
+        self.operations: Dict[str, OperationStats] = {}
+
+    def record(self, operation: str, seconds: float):
+        stats = self.operations.get(operation)
+        if stats is None:
+            stats = self.operations[operation] = OperationStats()
+        stats.count += 1
+        stats.total += seconds
+        stats.max = max(stats.max, seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                stats.buckets[i] += 1
+                break
+
+    def time_iterator(self, operation: str, iterator: Iterator) -> Iterator:
+        """Record the time spent producing items of a lazy result as one call."""
+        elapsed = 0.0
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += perf_counter() - start
+                yield item
+        finally:
+            self.record(operation, elapsed)
+
+    def rows(self) -> List[List]:
+        header = ["operation", "count", "total_ms", "mean_ms", "max_ms"]
+        header += [f"le_{bound * 1000:g}ms" for bound in BUCKETS[:-1]] + ["le_inf"]
+        rows = [header]
+        for operation, stats in sorted(self.operations.items()):
+            rows.append([
+                operation,
+                stats.count,
+                f"{stats.total * 1000:.3f}",
+                f"{stats.total * 1000 / stats.count:.3f}",
+                f"{stats.max * 1000:.3f}",
+                *stats.buckets
+            ])
+        return rows
+
+    def export_csv(self, path: str):
+        with open(path, 'w', newline='') as f:
+            csv.writer(f).writerows(self.rows())
+
+
+def timed(operation: str):
+    """Time a method of an object with a `metrics` attribute, if it's set."""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.metrics is None:
+                return method(self, *args, **kwargs)
+            start = perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.metrics.record(operation, perf_counter() - start)
+        return wrapper
+    return decorator
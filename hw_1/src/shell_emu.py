@@ -1,20 +1,27 @@
 import tkinter as tk
+from itertools import islice
 from tkinter import scrolledtext
-from src.logger import Logger
-from src.vfs import VirtualFileSystem
+from src.command_engine import CommandEngine
 
 class ShellEmulator(tk.Tk):
-    def __init__(self, username: str, tar_path: str, log_path: str):
+    # Completion candidates printed on an ambiguous Tab
+    MAX_CANDIDATES = 200
+
+    def __init__(self, engine: CommandEngine, scrollback: int = 10000, chunk_size: int = 500):
         super().__init__()
         
-        self.username = username
-        self.fs = VirtualFileSystem()
-        self.fs.load_from_tar(tar_path)
-        self.logger = Logger(log_path, username)
+        self.engine = engine
+        # Lines kept in the text area, older ones are dropped as new output arrives
+        self.scrollback = scrollback
+        # Output lines inserted per Tk tick
+        self.chunk_size = chunk_size
         
-        self.title(f"Shell Emulator - {username}")
+        self.title(f"Shell Emulator - {engine.username}")
         self.geometry("800x600")
         
+        # Pending after() callback of an output that is still being streamed
+        self.pending_output = None
+
         self.create_widgets()
         
     def create_widgets(self):
@@ -27,72 +34,78 @@ class ShellEmulator(tk.Tk):
         input_frame.pack(fill='x', padx=5, pady=5)
         
         # Create prompt label
-        self.prompt_label = tk.Label(
-            input_frame, 
-            text=f"{self.username}:{self.fs.current_directory}$ "
-        )
+        self.prompt_label = tk.Label(input_frame, text=self.engine.prompt())
         self.prompt_label.pack(side='left')
         
         # Create input entry
         self.input_entry = tk.Entry(input_frame)
         self.input_entry.pack(side='left', expand=True, fill='x')
         self.input_entry.bind('<Return>', self.process_command)
+        self.input_entry.bind('<Tab>', self.complete_command)
         
         # Set focus to input
         self.input_entry.focus()
         
     def update_prompt(self):
-        self.prompt_label.config(
-            text=f"{self.username}:{self.fs.current_directory}$ "
-        )
+        self.prompt_label.config(text=self.engine.prompt())
         
     def process_command(self, event):
         command = self.input_entry.get().strip()
         self.input_entry.delete(0, tk.END)
         
+        # A new command interrupts the output of the previous one
+        self.cancel_output()
+        
         if not command:
             return
             
-        # Log the command
-        self.logger.log(command.split()[0], " ".join(command.split()[1:]))
-        
-        # Display command in text area
-        self.text_area.insert(
-            tk.END, 
-            f"{self.username}:{self.fs.current_directory}$ {command}\n"
-        )
-        
-        # Process command
-        parts = command.split()
-        cmd = parts[0]
-        args = parts[1:]
-        
-        if cmd == "exit":
+        # The command echo goes out together with the first output chunk
+        echo = f"{self.engine.prompt()}{command}\n"
+        output = self.engine.execute(command)
+        if not self.engine.running:
             self.quit()
-        elif cmd == "ls":
-            path = args[0] if args else ""
-            files = self.fs.ls(path)
-            self.text_area.insert(tk.END, "  ".join(files) + "\n")
-        elif cmd == "cd":
-            if not args:
-                self.text_area.insert(tk.END, "cd: missing directory argument\n")
-            elif not self.fs.cd(args[0]):
-                self.text_area.insert(tk.END, f"cd: {args[0]}: No such directory\n")
-            self.update_prompt()
-        elif cmd == "rm":
-            if not args:
-                self.text_area.insert(tk.END, "rm: missing operand\n")
-            elif not self.fs.rm(args[0]):
-                self.text_area.insert(tk.END, f"rm: {args[0]}: No such file or directory\n")
-        elif cmd == "find":
-            if len(args) < 2:
-                self.text_area.insert(tk.END, "find: missing arguments\n")
-            else:
-                results = self.fs.find(args[0], args[1])
-                for result in results:
-                    self.text_area.insert(tk.END, f"{result}\n")
-        else:
-            self.text_area.insert(tk.END, f"command not found: {cmd}\n")
-        
+            return
+
+        self.update_prompt()
+        self.stream_output(iter(output), echo)
+
+    def complete_command(self, event):
+        line = self.input_entry.get()
+        completed, candidates = self.engine.complete(line)
+        if completed != line:
+            self.input_entry.delete(0, tk.END)
+            self.input_entry.insert(0, completed)
+        elif len(candidates) > 1:
+            shown = candidates[:self.MAX_CANDIDATES]
+            if len(candidates) > len(shown):
+                shown.append(f"... {len(candidates) - len(shown)} more")
+            self.write("  ".join(shown) + "\n")
+        # Keep the focus in the entry
+        return "break"
+
+    def stream_output(self, lines, prefix: str = ""):
+        # Insert one chunk per Tk tick so huge outputs don't freeze the window
+        self.pending_output = None
+        chunk = list(islice(lines, self.chunk_size))
+        self.write(prefix + "".join(f"{line}\n" for line in chunk))
+        if len(chunk) == self.chunk_size:
+            self.pending_output = self.after(1, self.stream_output, lines)
+
+    def write(self, text: str):
+        if text:
+            self.text_area.insert(tk.END, text)
+            self.trim_scrollback()
         # Scroll to bottom
-        self.text_area.see(tk.END)
\ No newline at end of file
+        self.text_area.see(tk.END)
+
+    def trim_scrollback(self):
+        # 'end-1c' is on the last (empty) line after the trailing newline
+        lines = int(self.text_area.index('end-1c').split('.')[0]) - 1
+        excess = lines - self.scrollback
+        if excess > 0:
+            self.text_area.delete('1.0', f'{excess + 1}.0')
+
+    def cancel_output(self):
+        if self.pending_output is not None:
+            self.after_cancel(self.pending_output)
+            self.pending_output = None
@@ -1,18 +1,85 @@
 import os
 import re
+import mmap
+import struct
+import fnmatch
 import tarfile
 from io import BytesIO
-from typing import Dict, List
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Union
 from datetime import datetime
 
 from src.common.file import File
+from src.gzip_index import IndexedGzipFile, is_gzip
+from src.metrics import CommandMetrics, timed
+from src.common.file_tree import FileTree
+from src.common.overlay_tree import OverlayTree
+
+# Index file layout: header, then one record + utf-8 path per entry
+INDEX_MAGIC = b"VFSI"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("<4sHQqI")   # magic, version, tar size, tar mtime_ns, entries
+INDEX_RECORD = struct.Struct("<BdQQI")    # flags, mtime, offset, size, path length
+FLAG_DIRECTORY = 1
+FLAG_HAS_OFFSET = 2
+
+
+@lru_cache(maxsize=64)
+def _compile_pattern(pattern: str, glob: bool) -> re.Pattern:
+    return re.compile(fnmatch.translate(pattern) if glob else pattern)
+
+
+def _entry_name(path: str) -> str:
+    return os.path.basename(path) or path
+
 
 class VirtualFileSystem:
-    def __init__(self):
-        self.files: Dict[str, File] = {}
+    def __init__(self, metrics: Optional[CommandMetrics] = None):
+        # Opt-in latency recording of the public operations
+        self.metrics = metrics
+        self.files: FileTree = FileTree()
         self.current_directory = "/"
+        # Archive backing lazily loaded files: an mmap, or an indexed reader for gzip
+        self._archive: Optional[Union[mmap.mmap, IndexedGzipFile]] = None
+        # Read-only file systems under an overlay, see `overlay`
+        self._layers: List["VirtualFileSystem"] = []
+
+    @classmethod
+    def overlay(cls, layers: List["VirtualFileSystem"]) -> "VirtualFileSystem":
+        """
+        Stack loaded file systems (bottom first) under a private writable layer.
+        The layers are shared, not copied, and are never modified through the
+        overlay, so any number of sessions can sit on the same base image.
+        """
+        fs = cls()
+        fs._layers = list(layers)
+        fs.files = OverlayTree([layer.files for layer in layers])
+        return fs
+
+    @property
+    def files(self) -> FileTree:
+        return self._files
+
+    @files.setter
+    def files(self, files: Dict[str, File]):
+        self._files = files if isinstance(files, (FileTree, OverlayTree)) else FileTree(files)
     
-    def load_from_tar(self, tar_path: str):
+    @timed("load")
+    def load(self, tar_path: str, lazy: bool = False, use_index: bool = False):
+        # The index lives next to the archive and is rebuilt whenever
+        # the archive's size or mtime no longer match
+        index_path = tar_path + ".idx"
+        if use_index and self.load_index(tar_path, index_path):
+            return
+
+        self.load_from_tar(tar_path, lazy=lazy or use_index)
+        if use_index:
+            self.save_index(tar_path, index_path)
+
+    def load_from_tar(self, tar_path: str, lazy: bool = False):
+        if lazy and self._load_lazy(tar_path):
+            return
+
         with open(tar_path, 'rb') as f:
             tar_content = f.read()
             
@@ -21,27 +88,180 @@ class VirtualFileSystem:
             self.files["/"] = File("/", b"", True, datetime.now().timestamp())
             
             for member in tar.getmembers():
-                path = "/" + member.name.lstrip("./")
-                
-                # Create intermediate directories
-                parts = path.split("/")
-                current_path = ""
-                for part in parts[:-1]:
-                    if part:
-                        current_path += "/" + part
-                        if current_path not in self.files:
-                            self.files[current_path] = File(
-                                current_path, 
-                                b"", 
-                                True,
-                                datetime.now().timestamp()
-                            )
+                path = self._add_parents(member.name)
                 
                 if member.isdir():
-                    self.files[path] = File(path, b"", True, member.mtime)
+                    self.files[path] = File(_entry_name(path), b"", True, member.mtime)
                 else:
                     file_content = tar.extractfile(member).read() if tar.extractfile(member) else b""
-                    self.files[path] = File(path, file_content, False, member.mtime)
+                    self.files[path] = File(_entry_name(path), file_content, False, member.mtime)
+
+    def _load_lazy(self, tar_path: str) -> bool:
+        """
+        Index only the tar headers, file bytes are read later by `read`.
+        Gzip archives are read through access points recorded during this
+        header pass. Returns False for other compressed archives, which have
+        to be loaded eagerly.
+        """
+        self._map_archive(tar_path)
+        try:
+            if isinstance(self._archive, IndexedGzipFile):
+                tar = tarfile.open(fileobj=self._archive, mode='r:')
+            else:
+                tar = tarfile.open(tar_path, 'r:')
+        except tarfile.ReadError:
+            self.close()
+            return False
+
+        with tar:
+            self.files["/"] = File("/", b"", True, datetime.now().timestamp())
+
+            # Walk headers one by one: tarfile seeks over the member data
+            # instead of reading it, and we don't keep its member list around
+            while (member := tar.next()) is not None:
+                tar.members.clear()
+                path = self._add_parents(member.name)
+
+                if member.isdir():
+                    self.files[path] = File(_entry_name(path), b"", True, member.mtime)
+                elif member.isreg():
+                    self.files[path] = File(
+                        _entry_name(path), b"", False, member.mtime,
+                        offset=member.offset_data, size=member.size
+                    )
+                else:
+                    # Symlinks, hardlinks and devices read as empty files, an
+                    # empty range keeps them indexable like regular members
+                    self.files[path] = File(_entry_name(path), b"", False, member.mtime, offset=0, size=0)
+
+        return True
+
+    def _map_archive(self, tar_path: str):
+        self.close()
+        if is_gzip(tar_path):
+            self._archive = IndexedGzipFile(tar_path)
+            return
+        with open(tar_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                self._archive = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def save_index(self, tar_path: str, index_path: str) -> bool:
+        """
+        Write the loaded entries to a binary index next to the archive.
+        Only lazily loaded file systems can be saved, since the index keeps
+        content offsets rather than the contents themselves.
+        """
+        if any(not file.is_directory and file.offset is None for file in self.files.values()):
+            return False
+
+        stat = os.stat(tar_path)
+        tmp_path = index_path + ".tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(INDEX_HEADER.pack(
+                    INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns, len(self.files)
+                ))
+                for path, file in self.files.items():
+                    encoded = path.encode('utf-8', 'surrogateescape')
+                    flags = FLAG_DIRECTORY if file.is_directory else 0
+                    if file.offset is not None:
+                        flags |= FLAG_HAS_OFFSET
+                    f.write(INDEX_RECORD.pack(
+                        flags, file.modified_time, file.offset or 0, file.size, len(encoded)
+                    ))
+                    f.write(encoded)
+            os.replace(tmp_path, index_path)
+        except OSError:
+            return False
+        return True
+
+    def load_index(self, tar_path: str, index_path: str) -> bool:
+        """
+        Restore entries from an index written by `save_index`.
+        Returns False if the index is missing, corrupt or older than the archive.
+        """
+        try:
+            stat = os.stat(tar_path)
+            with open(index_path, 'rb') as f:
+                index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+
+        with index:
+            try:
+                magic, version, tar_size, tar_mtime, count = INDEX_HEADER.unpack_from(index)
+            except struct.error:
+                return False
+            if (magic, version, tar_size, tar_mtime) != (
+                INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns
+            ):
+                return False
+
+            files = FileTree()
+            position = INDEX_HEADER.size
+            try:
+                for _ in range(count):
+                    flags, mtime, offset, size, length = INDEX_RECORD.unpack_from(index, position)
+                    position += INDEX_RECORD.size
+                    path = index[position:position + length].decode('utf-8', 'surrogateescape')
+                    position += length
+                    files[path] = File(
+                        _entry_name(path), b"", bool(flags & FLAG_DIRECTORY), mtime,
+                        offset=offset if flags & FLAG_HAS_OFFSET else None, size=size
+                    )
+            except struct.error:
+                return False
+            if position > len(index):
+                return False
+
+        self.files = files
+        self._map_archive(tar_path)
+        return True
+
+    def _add_parents(self, member_name: str) -> str:
+        path = "/" + member_name.lstrip("./")
+
+        # Create intermediate directories
+        parts = path.split("/")
+        current_path = ""
+        for part in parts[:-1]:
+            if part:
+                current_path += "/" + part
+                if current_path not in self.files:
+                    self.files[current_path] = File(
+                        _entry_name(current_path), 
+                        b"", 
+                        True,
+                        datetime.now().timestamp()
+                    )
+        return path
+
+    @timed("read")
+    def read(self, path: str) -> Optional[bytes]:
+        target_path = self._resolve_path(path)
+
+        if target_path not in self.files:
+            return None
+
+        file = self.files[target_path]
+        if file.is_directory:
+            return None
+        if self._layers:
+            layer = self.files.find_layer(target_path)
+            if layer is not None:
+                return self._layers[layer]._read_file(self._layers[layer].files[target_path])
+        return self._read_file(file)
+
+    def _read_file(self, file: File) -> bytes:
+        if file.offset is None:
+            return file.content
+        return self._archive[file.offset:file.offset + file.size]
+
+    def close(self):
+        # Overlay layers may be shared with other sessions, their owner closes them
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
 
     def _resolve_path(self, path: str) -> str:
         if not path:
@@ -50,6 +270,7 @@ class VirtualFileSystem:
             return os.path.normpath(path)
         return os.path.normpath(os.path.join(self.current_directory, path))
 
+    @timed("ls")
     def ls(self, path: str = "") -> List[str]:
         target_path = self._resolve_path(path)
         
@@ -59,15 +280,26 @@ class VirtualFileSystem:
         if not self.files[target_path].is_directory:
             return [os.path.basename(target_path)]
             
-        result = []
-        for file_path in self.files:
-            parent_dir = os.path.dirname(file_path)
-            if parent_dir == target_path and file_path != target_path:  # Добавляем проверку file_path != target_path
-                name = os.path.basename(file_path)
-                if name:  # Добавляем проверку на пустое имя
-                    result.append(name)
-        return sorted(result)
+        return self.files.sorted_children(target_path)
+
+    def is_directory(self, path: str) -> bool:
+        target_path = self._resolve_path(path)
+        return target_path in self.files and self.files[target_path].is_directory
+
+    @timed("complete")
+    def complete(self, partial: str) -> List[str]:
+        """
+        Paths that complete `partial` (relative or absolute), in order.
+        Only the directory part is resolved, its entries are found by prefix.
+        """
+        head, sep, prefix = partial.rpartition("/")
+        directory = self._resolve_path(head or sep)
+        if not self.is_directory(directory):
+            return []
+        base = head + sep
+        return [base + name for name in self.files.sorted_children(directory, prefix)]
 
+    @timed("cd")
     def cd(self, path: str) -> bool:
         new_path = self._resolve_path(path)
         
@@ -80,34 +312,49 @@ class VirtualFileSystem:
         self.current_directory = new_path
         return True
 
+    @timed("rm")
     def rm(self, path: str) -> bool:
         target_path = self._resolve_path(path)
         
         if target_path not in self.files:
             return False
             
-        # If directory, remove all children
-        if self.files[target_path].is_directory:
-            paths_to_remove = [p for p in self.files if p.startswith(target_path)]
-            for p in paths_to_remove:
-                del self.files[p]
-        else:
-            del self.files[target_path]
+        # Removes the directory together with all of its children
+        self.files.remove_subtree(target_path)
             
         return True
 
-    def find(self, path: str, pattern: str) -> List[str]:
+    def find(self, path: str, pattern: str, glob: bool = False,
+             max_depth: Optional[int] = None, limit: Optional[int] = None) -> List[str]:
+        return list(self.iter_find(path, pattern, glob, max_depth, limit))
+
+    def iter_find(self, path: str, pattern: str, glob: bool = False,
+                  max_depth: Optional[int] = None, limit: Optional[int] = None) -> Iterator[str]:
+        """
+        Lazily yield paths below `path` matching `pattern`, siblings in name order.
+        A regex is searched in the path relative to `path`, a glob (`glob=True`)
+        has to match the whole base name, like `find -name`.
+        """
         target_path = self._resolve_path(path)
-        if target_path not in self.files:
-            return []
-            
-        results = []
-        regex = re.compile(pattern)
-        
-        for file_path in self.files:
-            if file_path.startswith(target_path):
-                relative_path = file_path[len(target_path):].lstrip('/')
-                if regex.search(relative_path):
-                    results.append(file_path)
-                    
-        return sorted(results)
\ No newline at end of file
+        # Compiled here rather than in the generator so bad patterns fail right away
+        regex = _compile_pattern(pattern, glob)
+        if target_path not in self.files or limit == 0:
+            return iter(())
+        matches = self._find_matches(target_path, regex, glob, max_depth, limit)
+        if self.metrics is not None:
+            return self.metrics.time_iterator("find", matches)
+        return matches
+
+    def _find_matches(self, target_path: str, regex: re.Pattern, glob: bool,
+                      max_depth: Optional[int], limit: Optional[int]) -> Iterator[str]:
+        found = 0
+        for file_path, _ in self.files.walk(target_path, sort=True, max_depth=max_depth):
+            if glob:
+                matched = regex.match(os.path.basename(file_path) or file_path)
+            else:
+                matched = regex.search(file_path[len(target_path):].lstrip('/'))
+            if matched:
+                yield file_path
+                found += 1
+                if found == limit:
+                    return
@@ -1,10 +1,18 @@
 import unittest
 from unittest.mock import patch, mock_open, MagicMock
 import io
+import os
+import csv
+import gzip
 import tarfile
+import tempfile
 from datetime import datetime
 
 from src.vfs import VirtualFileSystem
+from src.logger import Logger, DURABILITY_BATCH
+from src.command_engine import CommandEngine
+from src.gzip_index import IndexedGzipFile
+from src.metrics import CommandMetrics
 from src.common.file import File
 
 class TestVirtualFileSystem(unittest.TestCase):
@@ -66,6 +74,30 @@ class TestVirtualFileSystem(unittest.TestCase):
         """Test 3: rm non-existent file"""
         self.assertFalse(self.fs.rm("/nonexistent"))
 
+    def test_rm_keeps_prefix_siblings(self):
+        """rm of a directory does not touch siblings sharing its name prefix"""
+        self.fs.files["/home/user2"] = File("/home/user2", b"", True, datetime.now().timestamp())
+        self.assertTrue(self.fs.rm("/home/user"))
+        self.assertIn("/home/user2", self.fs.files)
+        self.assertEqual(self.fs.ls("/home"), ["user2"])
+
+    def test_tree_index_tracks_mutations(self):
+        """Directory index follows additions and removals of entries"""
+        self.fs.files["/home/user/new.txt"] = File("/home/user/new.txt", b"", False, datetime.now().timestamp())
+        self.assertEqual(self.fs.ls("/home/user"), ["doc.pdf", "file.txt", "new.txt"])
+        del self.fs.files["/home/user/doc.pdf"]
+        self.assertEqual(self.fs.ls("/home/user"), ["file.txt", "new.txt"])
+        self.assertEqual(len(self.fs.files), 5)
+
+    def test_tree_records_after_removal(self):
+        """Records keep their fields and removed slots are reused safely"""
+        self.fs.rm("/home/user")
+        self.fs.files["/home/other.txt"] = File("other.txt", b"data", False, 1.5, offset=None, size=4)
+        record = self.fs.files["/home/other.txt"]
+        self.assertEqual((record.name, record.content, record.modified_time), ("other.txt", b"data", 1.5))
+        self.assertEqual(self.fs.ls("/home"), ["other.txt"])
+        self.assertEqual(sorted(self.fs.files), ["/", "/home", "/home/other.txt"])
+
     def test_find_exact(self):
         """Test 1: find exact filename"""
         results = self.fs.find("/home", "file.txt")
@@ -81,5 +113,338 @@ class TestVirtualFileSystem(unittest.TestCase):
         results = self.fs.find("/home", "nonexistent")
         self.assertEqual(results, [])
 
+    def test_find_glob_name(self):
+        """find -name matches the whole base name with a glob"""
+        self.assertEqual(self.fs.find("/", "*.txt", glob=True), ["/home/user/file.txt"])
+        self.assertEqual(self.fs.find("/", "file", glob=True), [])
+
+    def test_find_maxdepth_and_limit(self):
+        """find stops at max_depth and after limit results"""
+        self.assertEqual(self.fs.find("/", ".*", max_depth=1), ["/", "/home"])
+        self.assertEqual(self.fs.find("/home", "user", limit=1), ["/home/user"])
+
+    def test_iter_find_is_lazy(self):
+        """iter_find yields results in name order without walking everything up front"""
+        results = self.fs.iter_find("/home/user", ".")
+        self.assertEqual(next(results), "/home/user/doc.pdf")
+        self.assertEqual(list(results), ["/home/user/file.txt"])
+
+
+class TestTarLoading(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tar_path = os.path.join(self.tmp_dir.name, "vfs.tar")
+        with tarfile.open(self.tar_path, "w") as tar:
+            for name, data in (("vfs/a.txt", b"first file"), ("vfs/sub/b.txt", b"second")):
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        self.fs = VirtualFileSystem()
+
+    def tearDown(self):
+        self.fs.close()
+        self.tmp_dir.cleanup()
+
+    def test_eager_load(self):
+        """Eager mode keeps file contents in memory"""
+        self.fs.load_from_tar(self.tar_path)
+        self.assertEqual(self.fs.files["/vfs/a.txt"].content, b"first file")
+        self.assertEqual(self.fs.read("/vfs/sub/b.txt"), b"second")
+
+    def test_lazy_load(self):
+        """Lazy mode indexes headers and reads contents from the archive"""
+        self.fs.load_from_tar(self.tar_path, lazy=True)
+        self.assertEqual(self.fs.ls("/vfs"), ["a.txt", "sub"])
+        self.assertEqual(self.fs.files["/vfs/a.txt"].content, b"")
+        self.assertEqual(self.fs.read("/vfs/a.txt"), b"first file")
+        self.assertEqual(self.fs.read("/vfs/sub/b.txt"), b"second")
+
+    def test_lazy_load_compressed_falls_back(self):
+        """Compressed archives without random access are loaded eagerly"""
+        bz2_path = self.tar_path + ".bz2"
+        with tarfile.open(bz2_path, "w:bz2") as tar:
+            tar.add(self.tar_path, arcname="inner.tar")
+        self.fs.load_from_tar(bz2_path, lazy=True)
+        self.assertIsNone(self.fs.files["/inner.tar"].offset)
+        self.assertIsNone(self.fs.read("/missing"))
+
+    def test_lazy_load_gzip(self):
+        """Gzip archives are indexed lazily and read through access points"""
+        gz_path = self.tar_path + ".gz"
+        with tarfile.open(gz_path, "w:gz") as tar:
+            tar.add(self.tar_path, arcname="inner.tar")
+            for i in range(50):
+                data = os.urandom(4096)
+                info = tarfile.TarInfo(f"data/{i:02d}.bin")
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        self.fs.load_from_tar(gz_path, lazy=True)
+        self.assertIsNotNone(self.fs.files["/inner.tar"].offset)
+        with open(self.tar_path, "rb") as f:
+            self.assertEqual(self.fs.read("/inner.tar"), f.read())
+        with tarfile.open(gz_path) as tar:
+            expected = tar.extractfile("data/25.bin").read()
+        self.assertEqual(self.fs.read("/data/25.bin"), expected)
+
+    def test_index_roundtrip(self):
+        """Index restores entries and content offsets without parsing the tar"""
+        index_path = self.tar_path + ".idx"
+        self.fs.load_from_tar(self.tar_path, lazy=True)
+        self.assertTrue(self.fs.save_index(self.tar_path, index_path))
+
+        restored = VirtualFileSystem()
+        with patch("tarfile.open") as mock_open_tar:
+            self.assertTrue(restored.load_index(self.tar_path, index_path))
+            mock_open_tar.assert_not_called()
+        self.assertEqual(sorted(restored.files), sorted(self.fs.files))
+        self.assertEqual(restored.ls("/vfs"), ["a.txt", "sub"])
+        self.assertEqual(restored.read("/vfs/sub/b.txt"), b"second")
+        restored.close()
+
+    def test_index_saved_with_symlink(self):
+        """Members without contents of their own don't prevent saving the index"""
+        with tarfile.open(self.tar_path, "a") as tar:
+            info = tarfile.TarInfo("vfs/link.txt")
+            info.type = tarfile.SYMTYPE
+            info.linkname = "a.txt"
+            tar.addfile(info)
+        index_path = self.tar_path + ".idx"
+        self.fs.load_from_tar(self.tar_path, lazy=True)
+        self.assertTrue(self.fs.save_index(self.tar_path, index_path))
+
+        restored = VirtualFileSystem()
+        self.assertTrue(restored.load_index(self.tar_path, index_path))
+        self.assertEqual(restored.ls("/vfs"), ["a.txt", "link.txt", "sub"])
+        self.assertEqual(restored.read("/vfs/link.txt"), b"")
+        self.assertEqual(restored.read("/vfs/a.txt"), b"first file")
+        restored.close()
+
+    def test_index_invalidated_by_archive_change(self):
+        """Index is rejected once the archive's size or mtime changes"""
+        index_path = self.tar_path + ".idx"
+        self.fs.load_from_tar(self.tar_path, lazy=True)
+        self.fs.save_index(self.tar_path, index_path)
+
+        stat = os.stat(self.tar_path)
+        os.utime(self.tar_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertFalse(VirtualFileSystem().load_index(self.tar_path, index_path))
+
+    def test_index_not_saved_for_eager_load(self):
+        """Eagerly loaded contents have no offsets to index"""
+        self.fs.load_from_tar(self.tar_path)
+        self.assertFalse(self.fs.save_index(self.tar_path, self.tar_path + ".idx"))
+        self.assertFalse(os.path.exists(self.tar_path + ".idx"))
+
+
+class TestIndexedGzipFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data = b"".join(f"line {i:06d}\n".encode() for i in range(60000))
+        self.gz_path = os.path.join(self.tmp_dir.name, "data.gz")
+        with open(self.gz_path, "wb") as f:
+            # Two concatenated members
+            f.write(gzip.compress(self.data[:300000]))
+            f.write(gzip.compress(self.data[300000:]))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_random_access(self):
+        """Reads anywhere in the stream match the decompressed data"""
+        with IndexedGzipFile(self.gz_path, span=64 << 10) as gz:
+            for offset in (500000, 10, 299990, 700000, 0):
+                self.assertEqual(gz.read_at(offset, 100), self.data[offset:offset + 100])
+            self.assertGreater(len(gz._points_out), 1)
+            self.assertEqual(gz.read_at(len(self.data) - 5, 100), self.data[-5:])
+
+    def test_seek_and_read(self):
+        """File interface supports seek, tell and read"""
+        with IndexedGzipFile(self.gz_path) as gz:
+            gz.seek(123456)
+            self.assertEqual(gz.read(20), self.data[123456:123476])
+            self.assertEqual(gz.tell(), 123476)
+            self.assertEqual(gz.seek(0, io.SEEK_END), len(self.data))
+
+
+class TestOverlay(unittest.TestCase):
+    def setUp(self):
+        self.base = VirtualFileSystem()
+        self.base.files = {
+            "/": File("/", b"", True, 0.0),
+            "/etc": File("etc", b"", True, 0.0),
+            "/etc/hosts": File("hosts", b"base hosts", False, 0.0),
+            "/etc/passwd": File("passwd", b"root", False, 0.0),
+        }
+        self.patch = VirtualFileSystem()
+        self.patch.files = {
+            "/etc/hosts": File("hosts", b"patched hosts", False, 1.0),
+            "/opt": File("opt", b"", True, 1.0),
+        }
+
+    def test_layers_merge(self):
+        """Higher layers shadow lower ones and listings are merged"""
+        fs = VirtualFileSystem.overlay([self.base, self.patch])
+        self.assertEqual(fs.ls("/"), ["etc", "opt"])
+        self.assertEqual(fs.read("/etc/hosts"), b"patched hosts")
+        self.assertEqual(fs.read("/etc/passwd"), b"root")
+
+    def test_rm_records_whiteout(self):
+        """rm in an overlay hides lower entries without touching the shared layer"""
+        fs = VirtualFileSystem.overlay([self.base])
+        self.assertTrue(fs.rm("/etc"))
+        self.assertEqual(fs.ls("/"), [])
+        self.assertFalse(fs.cd("/etc"))
+        self.assertEqual(self.base.ls("/etc"), ["hosts", "passwd"])
+
+    def test_sessions_share_base(self):
+        """Sessions over one base keep independent changes"""
+        first = VirtualFileSystem.overlay([self.base])
+        second = VirtualFileSystem.overlay([self.base])
+        first.rm("/etc/hosts")
+        first.files["/etc/new"] = File("new", b"", False, 2.0)
+        self.assertEqual(first.find("/etc", "."), ["/etc/new", "/etc/passwd"])
+        self.assertEqual(second.find("/etc", "."), ["/etc/hosts", "/etc/passwd"])
+        self.assertEqual(len(first.files), 4)
+
+
+class TestCommandMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = CommandMetrics()
+        self.fs = VirtualFileSystem(self.metrics)
+        self.fs.files = {
+            "/": File("/", b"", True, 0.0),
+            "/a.txt": File("a.txt", b"", False, 0.0),
+        }
+
+    def test_operations_recorded(self):
+        """Timed VFS operations are counted, lazy find once it is consumed"""
+        self.fs.ls("/")
+        self.fs.ls("/")
+        self.fs.cd("/nope")
+        results = self.fs.iter_find("/", "a")
+        self.assertNotIn("find", self.metrics.operations)
+        self.assertEqual(list(results), ["/a.txt"])
+        self.assertEqual(self.metrics.operations["ls"].count, 2)
+        self.assertEqual(self.metrics.operations["cd"].count, 1)
+        self.assertEqual(self.metrics.operations["find"].count, 1)
+        self.assertEqual(sum(self.metrics.operations["ls"].buckets), 2)
+
+    def test_export_csv(self):
+        """Metrics are exported as one CSV row per operation"""
+        self.metrics.record("rm", 0.002)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "metrics.csv")
+            self.metrics.export_csv(path)
+            with open(path, newline='') as f:
+                rows = list(csv.reader(f))
+        self.assertEqual(rows[0][:5], ["operation", "count", "total_ms", "mean_ms", "max_ms"])
+        self.assertEqual(rows[1][:5], ["rm", "1", "2.000", "2.000", "2.000"])
+        self.assertEqual(rows[1][rows[0].index("le_10ms")], "1")
+
+    def test_disabled_by_default(self):
+        """Without metrics the VFS records nothing"""
+        fs = VirtualFileSystem()
+        fs.files = {"/": File("/", b"", True, 0.0)}
+        self.assertEqual(fs.ls("/"), [])
+        self.assertIsNone(fs.metrics)
+
+
+class TestLogger(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.log_path = os.path.join(self.tmp_dir.name, "log.csv")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read_rows(self, path=None):
+        with open(path or self.log_path, newline='') as f:
+            return list(csv.reader(f))
+
+    def test_log_per_command(self):
+        """Default durability writes every command right away"""
+        logger = Logger(self.log_path, "user")
+        logger.log("ls", "/home")
+        rows = self.read_rows()
+        self.assertEqual(rows[0], ['timestamp', 'username', 'command', 'arguments'])
+        self.assertEqual(rows[1][1:], ["user", "ls", "/home"])
+        logger.close()
+
+    def test_log_batched(self):
+        """Batched durability buffers commands until flushed or closed"""
+        logger = Logger(self.log_path, "user", durability=DURABILITY_BATCH, flush_interval=60)
+        logger.log("cd", "/home")
+        self.assertEqual(len(self.read_rows()), 1)
+        logger.close()
+        self.assertEqual(self.read_rows()[1][1:], ["user", "cd", "/home"])
+
+    def test_log_rotation(self):
+        """Log file is rotated once it grows past max_bytes"""
+        logger = Logger(self.log_path, "user", max_bytes=100)
+        for i in range(5):
+            logger.log("find", f"/ pattern{i}")
+        logger.close()
+        self.assertTrue(os.path.exists(self.log_path + ".1"))
+        self.assertEqual(self.read_rows()[0], ['timestamp', 'username', 'command', 'arguments'])
+        self.assertEqual(self.read_rows(self.log_path + ".1")[0][0], 'timestamp')
+
+
+class TestCommandEngine(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.fs = VirtualFileSystem()
+        self.fs.files = {
+            "/": File("/", b"", True, 0.0),
+            "/home": File("home", b"", True, 0.0),
+            "/home/a.txt": File("a.txt", b"", False, 0.0),
+            "/home/b.txt": File("b.txt", b"", False, 0.0),
+        }
+        self.logger = Logger(os.path.join(self.tmp_dir.name, "log.csv"), "user")
+        self.engine = CommandEngine("user", self.fs, self.logger)
+
+    def tearDown(self):
+        self.logger.close()
+        self.tmp_dir.cleanup()
+
+    def test_execute_commands(self):
+        """Engine runs commands and returns their output without a UI"""
+        self.assertEqual(list(self.engine.execute("cd home")), [])
+        self.assertEqual(self.engine.prompt(), "user:/home$ ")
+        self.assertEqual(list(self.engine.execute("ls")), ["a.txt  b.txt"])
+        self.assertEqual(list(self.engine.execute("rm c.txt")), ["rm: c.txt: No such file or directory"])
+        self.assertEqual(list(self.engine.execute("pwd")), ["command not found: pwd"])
+
+    def test_find_options(self):
+        """find options are parsed and invalid ones reported"""
+        self.assertEqual(list(self.engine.execute("find / -name *.txt -limit 1")), ["/home/a.txt"])
+        self.assertEqual(list(self.engine.execute("find / -maxdepth x a")), ["find: -maxdepth: invalid number"])
+        self.assertEqual(list(self.engine.execute("find /")), ["find: missing arguments"])
+        self.assertTrue(list(self.engine.execute("find / ("))[0].startswith("find: invalid pattern"))
+
+    def test_complete(self):
+        """Tab completion extends commands and paths to their common prefix"""
+        self.assertEqual(self.engine.complete("f"), ("find ", ["find"]))
+        self.assertEqual(self.engine.complete("cd ho"), ("cd home/", ["home"]))
+        self.assertEqual(self.engine.complete("ls /home/"), ("ls /home/", ["/home/a.txt", "/home/b.txt"]))
+        self.assertEqual(self.engine.complete("rm /home/b"), ("rm /home/b.txt ", ["/home/b.txt"]))
+        self.assertEqual(self.engine.complete("ls /nope/"), ("ls /nope/", []))
+
+    def test_complete_follows_changes(self):
+        """Prefix index stays in sync with rm and new entries"""
+        self.assertEqual(self.fs.complete("/home/"), ["/home/a.txt", "/home/b.txt"])
+        self.fs.rm("/home/a.txt")
+        self.fs.files["/home/ab"] = File("ab", b"", True, 0.0)
+        self.assertEqual(self.fs.complete("/home/a"), ["/home/ab"])
+        self.assertEqual(self.fs.ls("/home"), ["ab", "b.txt"])
+
+    def test_run_script(self):
+        """Scripts run until exit and write output to the given stream"""
+        output = io.StringIO()
+        executed = self.engine.run_script(io.StringIO("# comment\nls /home\n\nexit\nls\n"), output)
+        self.assertEqual(executed, 2)
+        self.assertFalse(self.engine.running)
+        self.assertEqual(output.getvalue(), "a.txt  b.txt\n")
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,295 @@
+import io
+import re
+import sys
+import gzip
+import time
+import random
+import argparse
+import threading
+from typing import Dict, List, Sequence, Set
+from urllib.request import urlopen
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.control_parser import parse_packages
+from src.common.package_info import PackageInfo
+from src.common.repository import Repository
+from src.dependency_graph import DependencyGraph
+from src.dependency_analyzer import DependencyAnalyzer
+from src.emitters import MermaidEmitter, emit_graph
+from src.profiling import Profiler, max_rss
+from src.repo_manager import RepositoryManager
+
+
+def legacy_parse(content: str) -> Dict[str, PackageInfo]:
+    # Line-based parser with a regex per dependency, as used before control_parser
+    packages: Dict[str, PackageInfo] = {}
+    current_package = ""
+    current_depends: Set[str] = set()
+
+    for line in content.splitlines():
+        if line.startswith("Package: "):
+            if current_package:
+                packages[current_package] = PackageInfo(current_package, current_depends)
+            current_package = line.split("Package: ")[1].strip()
+            current_depends = set()
+        elif line.startswith("Depends: "):
+            deps_str = line.split("Depends: ")[1]
+            for dep in deps_str.split(","):
+                dep = dep.strip()
+                match = re.match(r'^([a-zA-Z0-9\-\.]+)(?:\s|$|\(|\[)', dep)
+                if match:
+                    dep_name = match.group(1)
+                    if "|" not in dep:
+                        current_depends.add(dep_name)
+
+    if current_package:
+        packages[current_package] = PackageInfo(current_package, current_depends)
+
+    return packages
+
+
+def stanza_lines(i: int, depends: Sequence[str]) -> List[str]:
+    """Lines of a stanza for package pkg<i>, with the field set and order of a jammy amd64 stanza."""
+    return [
+        f"Package: pkg{i:06d}",
+        "Architecture: amd64",
+        f"Version: 1.{i % 10}-0ubuntu1",
+        "Multi-Arch: same",
+        "Priority: optional",
+        "Section: libs",
+        f"Source: src{i // 3:06d}",
+        "Origin: Ubuntu",
+        "Maintainer: Ubuntu Developers <ubuntu-devel-discuss@lists.ubuntu.com>",
+        "Original-Maintainer: Debian Maintainers <maintainers@lists.debian.org>",
+        "Bugs: https://bugs.launchpad.net/ubuntu/+filebug",
+        f"Installed-Size: {i % 5000}",
+        f"Provides: virtual{i % 100:03d}",
+        "Pre-Depends: libc6 (>= 2.34)",
+        *([f"Depends: {', '.join(depends)}"] if depends else []),
+        f"Recommends: rec{i % 300:03d}",
+        f"Suggests: sug{i % 300:03d}",
+        "Breaks: old-package (<< 1.0)",
+        "Replaces: old-package (<< 1.0)",
+        f"Filename: pool/main/p/pkg{i:06d}/pkg{i:06d}_1.0_amd64.deb",
+        f"Size: {1000 + i}",
+        f"MD5sum: {i:032x}",
+        f"SHA1: {i:040x}",
+        f"SHA256: {i:064x}",
+        f"SHA512: {i:0128x}",
+        "Homepage: https://example.org/",
+        "Description: synthetic package",
+        " Long description of the synthetic package, which wraps onto several",
+        " lines the way most real package descriptions do.",
+        " .",
+        " This second paragraph lists a few of the features the package",
+        " provides and how it relates to the other packages in the archive.",
+        "Task: ubuntu-desktop",
+        f"Description-md5: {i:032x}",
+        "",
+    ]
+
+
+def synthetic_packages(stanzas: int, fanout: int = 6) -> bytes:
+    """A Packages file with fields and dependency lists shaped like a real Ubuntu index."""
+    # Like in real indexes, most dependencies point at a small set of common libraries
+    libraries = max(1, stanzas // 20)
+    lines = []
+    for i in range(stanzas):
+        depends = [f"lib{(i * 31 + j * 7) % libraries:06d} (>= 1.{j % 3})" for j in range(fanout)]
+        depends.append(f"alt{i % 50:03d} | alt{(i + 1) % 50:03d}")
+        # and a few are specific to the package, so whole fields rarely repeat
+        depends.append(f"pkg{i:06d}-data (= 1.{i % 10}-0ubuntu1)")
+        lines += stanza_lines(i, depends)
+    return "\n".join(lines).encode('utf-8')
+
+
+def synthetic_graph(packages: int, fanout: int, depth: int, cycles: float, seed: int = 0) -> bytes:
+    """
+    A Packages file whose dependency graph has a chosen shape. Packages are
+    split into depth + 1 layers and each depends on `fanout` packages of the
+    next layer, so closures of the first layer reach `depth` levels down.
+    A `cycles` fraction of the packages below the first layer also depends
+    on a first layer package, closing a cycle.
+    """
+    rng = random.Random(seed)
+    layer_size = max(1, packages // (depth + 1))
+    lines = []
+    for i in range(packages):
+        layer, position = divmod(i, layer_size)
+        depends = []
+        if (layer + 1) * layer_size + layer_size <= packages:
+            first = (layer + 1) * layer_size
+            targets = {first + (position * 31 + j * 7) % layer_size for j in range(fanout)}
+            depends += [f"pkg{target:06d} (>= 1.0)" for target in sorted(targets)]
+        if layer > 0 and rng.random() < cycles:
+            depends.append(f"pkg{rng.randrange(layer_size):06d}")
+        lines += stanza_lines(i, depends)
+    return "\n".join(lines).encode('utf-8')
+
+
+def serve_bytes(body: bytes) -> ThreadingHTTPServer:
+    """Local stand-in for a mirror, serving `body` at every path."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def best_of(repeat: int, *functions) -> List[float]:
+    """Best time of each function, runs are interleaved so load changes hit all of them."""
+    best = [float("inf")] * len(functions)
+    for _ in range(repeat):
+        for i, function in enumerate(functions):
+            start = time.perf_counter()
+            function()
+            best[i] = min(best[i], time.perf_counter() - start)
+    return best
+
+
+def run_parser(stanzas: int, repeat: int):
+    data = synthetic_packages(stanzas)
+    text = data.decode('utf-8')
+    # Chunks the size of a streamed download block
+    chunks = [data[i:i + (1 << 20)] for i in range(0, len(data), 1 << 20)]
+
+    legacy, current = best_of(
+        repeat,
+        lambda: legacy_parse(text),
+        lambda: {info.name: info for info in parse_packages(chunks)}
+    )
+    print(f"stanzas: {stanzas} ({len(data) / 2**20:.1f} MiB)")
+    print(f"legacy line parser:    {legacy * 1000:10.1f} ms")
+    print(f"control_parser:        {current * 1000:10.1f} ms  ({legacy / current:.1f}x)")
+
+
+def run_pipeline(packages: int, fanout: int, depth: int, cycles: float,
+                 roots: int, max_depth: int, trace_memory: bool):
+    data = synthetic_graph(packages, fanout, depth, cycles)
+    compressed = gzip.compress(data)
+    server = serve_bytes(compressed)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    print(f"packages: {packages} ({len(data) / 2**20:.1f} MiB, {len(compressed) / 2**20:.1f} MiB gzipped), "
+          f"fanout {fanout}, depth {depth}, cycles {cycles:.0%}")
+
+    # Every phase on its own, one after another
+    profiler = Profiler(trace_memory)
+    with profiler.phase("download"):
+        with urlopen(f"{base_url}/Packages.gz") as response:
+            body = response.read()
+    with profiler.phase("decompress"):
+        raw = gzip.decompress(body)
+    with profiler.phase("parse"):
+        index = {info.name: info for info in parse_packages([raw])}
+    with profiler.phase("graph"):
+        graph = DependencyGraph.from_packages(index)
+    del body, raw, index
+
+    analyzer = DependencyAnalyzer(max_depth)
+    analyzer.repo_manager.graph = graph
+    names = [f"pkg{i:06d}" for i in range(min(roots, packages))]
+    with profiler.phase("analysis"):
+        graphs = [analyzer.analyze_package(name)[0] for name in names]
+    with profiler.phase("mermaid"):
+        size = 0
+        for name, dependencies in zip(names, graphs):
+            stream = io.StringIO()
+            emit_graph(MermaidEmitter(stream), dependencies, name)
+            size += stream.tell()
+    print(f"\nseparate phases, {len(names)} roots, {size / 2**20:.1f} MiB of Mermaid:")
+    profiler.report(sys.stdout)
+
+    # The same download as RepositoryManager streams it, phases alternate block by block
+    manager = RepositoryManager()
+    manager.repository = Repository("benchmark", base_url, "benchmark", "main")
+    manager.components = ["main"]
+    manager.profiler = Profiler(trace_memory)
+    manager.load_repository_data()
+    print("\nstreamed load:")
+    manager.profiler.report(sys.stdout)
+    server.shutdown()
+    server.server_close()
+
+
+def run_batch(packages: int, fanout: int, depth: int, cycles: float,
+              roots: int, max_depth: int, repeat: int):
+    index = {info.name: info for info in parse_packages([synthetic_graph(packages, fanout, depth, cycles)])}
+    analyzer = DependencyAnalyzer(max_depth)
+    analyzer.repo_manager.graph = DependencyGraph.from_packages(index)
+    del index
+    names = [f"pkg{i % packages:06d}" for i in range(roots)]
+
+    # A warm index: repository loaded and direct lookups already memoized
+    reached = sum(len(analyzer.analyze_package(name)[1]) for name in names)
+
+    def analyze_batch():
+        for _ in analyzer.analyze_batch(names):
+            pass
+
+    def analyze_dependencies():
+        for name in names:
+            analyzer.dependencies = {}
+            analyzer.analyze_dependencies(name)
+
+    batch, single = best_of(repeat, analyze_batch, analyze_dependencies)
+    print(f"packages: {packages}, fanout {fanout}, depth {depth}, cycles {cycles:.0%}, "
+          f"{roots} roots to depth {max_depth}, {reached / roots:.0f} packages reached per root")
+    print(f"analyze_batch:         {batch * 1000:10.1f} ms  ({roots / batch * 60:,.0f} packages/min)")
+    print(f"analyze_dependencies:  {single * 1000:10.1f} ms  ({roots / single * 60:,.0f} packages/min)")
+    rss = max_rss()
+    if rss is not None:
+        print(f"peak RSS:              {rss / 2**20:10.1f} MiB")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Dependency visualizer benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    parse = subparsers.add_parser("parser", help="Packages file parsing speed")
+    parse.add_argument('--stanzas', type=int, default=100000, help="Number of synthetic stanzas")
+    parse.add_argument('--repeat', type=int, default=3, help="Runs per parser, the best one is reported")
+
+    pipeline = subparsers.add_parser("pipeline", help="Time every phase from download to Mermaid")
+    pipeline.add_argument('--packages', type=int, default=60000, help="Number of synthetic packages")
+    pipeline.add_argument('--fanout', type=int, default=6, help="Dependencies of every package")
+    pipeline.add_argument('--depth', type=int, default=8, help="Levels of dependencies below the first")
+    pipeline.add_argument('--cycles', type=float, default=0.01,
+                          help="Fraction of packages depending back on the first level")
+    pipeline.add_argument('--roots', type=int, default=100, help="Packages to analyze and emit")
+    pipeline.add_argument('--max-depth', type=int, default=3, help="Analysis depth")
+    pipeline.add_argument('--trace-memory', action='store_true',
+                          help="Record peak Python memory per phase, slows every phase down")
+
+    batch = subparsers.add_parser("batch", help="Batch analysis throughput on a warm index")
+    batch.add_argument('--packages', type=int, default=30000, help="Number of synthetic packages")
+    batch.add_argument('--fanout', type=int, default=6, help="Dependencies of every package")
+    batch.add_argument('--depth', type=int, default=8, help="Levels of dependencies below the first")
+    batch.add_argument('--cycles', type=float, default=0.05,
+                       help="Fraction of packages depending back on the first level")
+    batch.add_argument('--roots', type=int, default=200, help="Packages to analyze")
+    batch.add_argument('--max-depth', type=int, default=6, help="Analysis depth")
+    batch.add_argument('--repeat', type=int, default=3, help="Runs per method, the best one is reported")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.benchmark == "parser":
+        run_parser(args.stanzas, args.repeat)
+    elif args.benchmark == "pipeline":
+        run_pipeline(args.packages, args.fanout, args.depth, args.cycles,
+                     args.roots, args.max_depth, args.trace_memory)
+    elif args.benchmark == "batch":
+        run_batch(args.packages, args.fanout, args.depth, args.cycles,
+                  args.roots, args.max_depth, args.repeat)
+
+if __name__ == "__main__":
+    main()
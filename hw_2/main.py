@@ -1,27 +1,196 @@
 import os
+import sys
+import asyncio
 import logging
 import argparse
 import webbrowser
+from typing import List, Optional
 
 from src.common.repository import Repository
+from src.index_cache import IndexCache
+from src.emitters import EMITTERS
 from src.dependency_analyzer import DependencyAnalyzer
-from src.dependency_visualizer import DependencyVisualizer
+from src.dependency_visualizer import DEFAULT_WORKERS, DependencyVisualizer
+from src.query_server import DEFAULT_ADDRESS, QueryServer, query
+from src.profiling import Profiler
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Visualize Ubuntu package dependencies')
-    parser.add_argument('--visualizer', required=True, help='Path to graph visualizer')
-    parser.add_argument('--package', required=True, help='Package to analyze')
+    parser.add_argument('--visualizer', help='Path to graph visualizer')
+    packages = parser.add_mutually_exclusive_group()
+    packages.add_argument('--package', help='Package to analyze')
+    packages.add_argument('--packages-file',
+                          help="File with packages to analyze in one run, one per line, '-' for stdin")
+    parser.add_argument('--output-dir', default='graphs',
+                       help='Directory for the per-package graphs of --packages-file')
+    parser.add_argument('--format', choices=sorted(EMITTERS), default='mermaid',
+                       help='Graph format, other formats than mermaid are written to stdout')
+    parser.add_argument('--render', action='store_true',
+                       help='Also render every Mermaid graph of --packages-file to <package>.svg')
+    parser.add_argument('--jobs', type=int, default=DEFAULT_WORKERS,
+                       help='Visualizer processes running at once with --render')
+    parser.add_argument('--render-cache', help='Directory to cache rendered graphs by content')
     parser.add_argument('--max-depth', type=int, default=3, help='Maximum dependency depth')
+    parser.add_argument('--reverse', action='store_true',
+                       help='Show packages that depend on the package instead')
     parser.add_argument('--repo-url', help='Ubuntu repository URL',
                        default='http://archive.ubuntu.com/ubuntu')
     parser.add_argument('--distribution', help='Ubuntu distribution',
                        default='jammy')
-    parser.add_argument('--component', help='Repository component',
-                       default='main')
+    parser.add_argument('--component',
+                       help='Comma-separated repository components (default: main,universe)')
+    parser.add_argument('--architecture', help='Package architecture', default='amd64')
+    parser.add_argument('--compare', metavar='DISTRIBUTION[/ARCHITECTURE]',
+                       help="Print how the package's dependency closure differs in another release")
+    parser.add_argument('--cache-dir', help='Directory for cached repository indexes',
+                       default=os.path.join(os.path.expanduser('~'), '.cache', 'dependency-visualizer'))
+    parser.add_argument('--no-cache', action='store_true', help='Always download and parse indexes')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode')
+    parser.add_argument('--profile', action='store_true',
+                       help='Print the time spent in each phase of the run to stderr')
+    parser.add_argument('--serve', nargs='?', const=DEFAULT_ADDRESS, metavar='HOST:PORT',
+                       help=f'Keep the repository loaded and answer queries (default {DEFAULT_ADDRESS})')
+    parser.add_argument('--server', nargs='?', const=DEFAULT_ADDRESS, metavar='HOST:PORT',
+                       help='Ask a running --serve process instead of loading the repository')
+
+    args = parser.parse_args()
+    if not args.serve:
+        if not (args.package or args.packages_file):
+            parser.error('one of the arguments --package --packages-file is required')
+        if not args.visualizer:
+            parser.error('the following arguments are required: --visualizer')
+    if args.server and args.packages_file:
+        parser.error('--server only answers --package queries')
+    if args.compare and not args.package:
+        parser.error('--compare needs --package')
+    return args
+
+
+def run_client(args) -> None:
+    """Answer a --package query through a running server."""
+    try:
+        response = query(args.server, {
+            "op": "graph", "package": args.package, "depth": args.max_depth,
+            "reverse": args.reverse, "format": args.format,
+        })
+    except OSError as e:
+        logging.error(f"Failed to query server at {args.server}: {e}")
+        sys.exit(1)
+    if not response["ok"]:
+        logging.error(f"Server error: {response['error']}")
+        sys.exit(1)
+    if args.format != 'mermaid':
+        sys.stdout.write(response["result"])
+        return
+    show_graph(DependencyVisualizer(args.visualizer, args.render_cache),
+               response["result"].rstrip("\n"), args.package)
+
+
+def show_graph(visualizer: DependencyVisualizer, mermaid_content: str, package: str) -> None:
+    """Print the diagram and render it to <package>.svg in the working directory."""
+    image = visualizer.visualize(mermaid_content, f"{package}.svg")
+    if image:
+        print(f"Graph image written to {image}")
+
+
+def run_compare(analyzer: DependencyAnalyzer, package: str, other: str) -> None:
+    """Print the closure of a package in the configured release against another release."""
+    repository = analyzer.repo_manager.repository
+    distribution, _, architecture = other.partition('/')
+    architecture = architecture or repository.architecture
+    store = analyzer.repo_manager.load_releases(
+        dict.fromkeys([(repository.distribution, repository.architecture), (distribution, architecture)])
+    )
+    old = f"{repository.distribution}/{repository.architecture}"
+    new = f"{distribution}/{architecture}"
+    added, removed = store.closure_diff(package, old, new, analyzer.max_depth)
+    for name in sorted(added):
+        print(f"+ {name}")
+    for name in sorted(removed):
+        print(f"- {name}")
+    print(f"{package}: {len(added)} added, {len(removed)} removed from {old} to {new}")
+
+
+def read_packages(path: str) -> List[str]:
+    """Package names from a file or stdin, skipping blank lines and comments."""
+    with (sys.stdin if path == '-' else open(path)) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def run_batch(analyzer: DependencyAnalyzer, packages_file: str, output_dir: str, format: str,
+              visualizer: Optional[DependencyVisualizer] = None, jobs: int = DEFAULT_WORKERS):
+    """
+    Write a graph per package and print a one-line report for each,
+    then render the graphs if a visualizer is given.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    extension = EMITTERS[format].extension
+    profiler = analyzer.repo_manager.profiler
+    phase = analyzer.repo_manager.phase
+    analyses = analyzer.analyze_batch(read_packages(packages_file))
+    if profiler:
+        analyzer.repo_manager.get_graph()
+        analyses = profiler.timed_iter(analyses, "analysis")
+    graphs = []
+    for package, dependencies, depths in analyses:
+        analyzer.dependencies = dependencies
+        analyzer.depths = depths
+        graph_path = os.path.join(output_dir, f"{package}.{extension}")
+        with open(graph_path, 'w') as f, phase("emit"):
+            analyzer.write_graph(f, format)
+        graphs.append(graph_path)
+        print(f"{package}: {len(depths) - 1} dependencies, {len(dependencies)} expanded")
+
+    if visualizer:
+        contents = []
+        for graph_path in graphs:
+            with open(graph_path) as f:
+                contents.append(f.read())
+        images = [os.path.splitext(graph_path)[0] + ".svg" for graph_path in graphs]
+        with phase("render"):
+            results = visualizer.visualize_many(contents, images, jobs)
+        print(f"Rendered {sum(result is not None for result in results)} of {len(results)} graphs")
+
+
+def run(args, analyzer: DependencyAnalyzer) -> None:
+    """Do what the arguments ask for with a configured analyzer."""
+    phase = analyzer.repo_manager.phase
+    if args.serve:
+        try:
+            asyncio.run(QueryServer(analyzer).serve(args.serve))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.compare:
+        run_compare(analyzer, args.package, args.compare)
+        return
+
+    if args.packages_file:
+        render = args.render and args.format == 'mermaid'
+        visualizer = DependencyVisualizer(args.visualizer, args.render_cache) if render else None
+        run_batch(analyzer, args.packages_file, args.output_dir, args.format, visualizer, args.jobs)
+        return
+
+    if analyzer.repo_manager.profiler:
+        # Loaded up front, the load's own phases aren't counted as analysis
+        analyzer.repo_manager.get_graph()
+    with phase("analysis"):
+        analyzer.analyze_dependencies(args.package)
+    if args.format != 'mermaid':
+        with phase("emit"):
+            analyzer.write_graph(sys.stdout, args.format)
+        return
     
-    return parser.parse_args()
+    # Generate Mermaid diagram
+    with phase("emit"):
+        mermaid_content = analyzer.generate_mermaid()
+    
+    # Visualize the graph
+    visualizer = DependencyVisualizer(args.visualizer, args.render_cache)
+    with phase("render"):
+        show_graph(visualizer, mermaid_content, args.package)
 
 
 def main():
@@ -30,29 +199,39 @@ def main():
     # Configure logging
     log_level = logging.DEBUG if args.debug else logging.INFO
     logging.basicConfig(level=log_level)
+
+    if args.server:
+        run_client(args)
+        return
     
     # Analyze dependencies
     analyzer = DependencyAnalyzer(args.max_depth)
     analyzer.debug_mode = args.debug
+    analyzer.reverse = args.reverse
     analyzer.repo_manager.debug_mode = args.debug
+    if not args.no_cache:
+        analyzer.repo_manager.index_cache = IndexCache(args.cache_dir)
     
+    if args.component:
+        analyzer.repo_manager.components = args.component.split(',')
+
     # Configure repository if custom parameters provided
     if args.repo_url or args.distribution:
         analyzer.repo_manager.repository = Repository(
             name="custom",
             url=args.repo_url,
             distribution=args.distribution,
-            component="main"  # component теперь обрабатывается внутри
+            component=analyzer.repo_manager.components[0],
+            architecture=args.architecture
         )
     
-    analyzer.analyze_dependencies(args.package)
-    
-    # Generate Mermaid diagram
-    mermaid_content = analyzer.generate_mermaid()
-    
-    # Visualize the graph
-    visualizer = DependencyVisualizer(args.visualizer)
-    visualizer.visualize(mermaid_content)
+    profiler = Profiler() if args.profile else None
+    analyzer.repo_manager.profiler = profiler
+    try:
+        run(args, analyzer)
+    finally:
+        if profiler:
+            profiler.report()
 
 if __name__ == "__main__":
     main()
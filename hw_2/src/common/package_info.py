@@ -1,7 +1,20 @@
-from typing import Set
+from typing import NamedTuple, Optional, Set, Tuple
 from dataclasses import dataclass
 
-@dataclass
+class Relation(NamedTuple):
+    name: str
+    # Version constraint, e.g. (">=", "2.34"), both None when unversioned
+    op: Optional[str] = None
+    version: Optional[str] = None
+
+@dataclass(slots=True)
 class PackageInfo:
     name: str
+    # Names of the hard dependencies, alternative groups are left out
     depends: Set[str]
+    version: str = ""
+    # Each group holds alternatives, any one of them satisfies it.
+    # Tuples, so that packages with identical fields can share them
+    depends_relations: Tuple[Tuple[Relation, ...], ...] = ()
+    pre_depends: Tuple[Tuple[Relation, ...], ...] = ()
+    provides: Tuple[Relation, ...] = ()
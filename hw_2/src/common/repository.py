@@ -6,3 +6,4 @@ class Repository:
     url: str
     distribution: str
     component: str
+    architecture: str = "amd64"
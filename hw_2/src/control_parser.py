@@ -0,0 +1,179 @@
+import gc
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.common.package_info import PackageInfo, Relation
+
+# Either a field this parser keeps, with its continuation lines, or the blank line
+# that ends a stanza. Other fields are skipped by the regex engine without ever
+# reaching Python code. Anchoring on the newline rather than "^" in multiline
+# mode lets the engine jump between line starts instead of trying every byte
+_FIELD_RE = re.compile(
+    rb'\n(?:(Package|Version|Depends|Pre-Depends|Provides):[ \t]*(.*(?:\n[ \t].*)*)|(?=\n))'
+)
+
+# Name, optional architecture qualifier (":any") and optional version constraint.
+# Architecture lists ("[amd64]") and build profiles ("<!nocheck>") that may follow are ignored
+_RELATION_RE = re.compile(r'\s*([^\s(\[<:]+)(?::[^\s(\[<]+)?\s*(?:\(\s*([<>=]+)\s*([^\s)]+)\s*\))?')
+
+# Groups of alternatives, any relation in a group satisfies it
+Relations = Tuple[Tuple[Relation, ...], ...]
+
+# Garbage collection is switched for the whole process, concurrent pauses are
+# counted so only the outermost one restores it
+_gc_lock = threading.Lock()
+_gc_pauses = 0
+_gc_was_enabled = False
+
+
+@contextmanager
+def paused_gc() -> Iterator[None]:
+    """
+    Pause the cyclic garbage collector. Parsing only allocates objects without
+    reference cycles, running the collector every few hundred of them would
+    only slow it down. Safe to nest and to enter from several threads.
+    """
+    global _gc_pauses, _gc_was_enabled
+    with _gc_lock:
+        if _gc_pauses == 0:
+            _gc_was_enabled = gc.isenabled()
+            gc.disable()
+        _gc_pauses += 1
+    try:
+        yield
+    finally:
+        with _gc_lock:
+            _gc_pauses -= 1
+            if _gc_pauses == 0 and _gc_was_enabled:
+                gc.enable()
+
+
+def parse_relation(text: str) -> Optional[Relation]:
+    """Parse one relation like "libc6 (>= 2.34)", None if there's no package name."""
+    match = _RELATION_RE.match(text)
+    return Relation(*match.groups()) if match else None
+
+
+def _parse_group(text: str, cache: Dict) -> Tuple[Relation, ...]:
+    """Parse one comma-separated group of alternatives and remember it in `cache`."""
+    if "|" in text:
+        group = tuple(r for r in map(parse_relation, text.split("|")) if r is not None)
+    else:
+        match = _RELATION_RE.match(text)
+        group = (Relation(match[1], match[2], match[3]),) if match else ()
+    cache[text] = group
+    return group
+
+
+def parse_relations(value: str) -> Relations:
+    """Parse a Depends-style field into groups of alternatives."""
+    cache: Dict = {}
+    groups = (_parse_group(text, cache) for text in value.split(","))
+    return tuple(group for group in groups if group)
+
+
+def _parse_field(value: bytes, cache: Dict) -> Tuple[Relations, List[str]]:
+    """
+    Relation groups of a raw field value and the names of its hard dependencies.
+    `cache` maps both raw fields and group texts to their parsed form.
+    """
+    result = cache.get(value)
+    if result is not None:
+        return result
+
+    groups = []
+    hard = []
+    for text in value.decode('utf-8').split(","):
+        group = cache.get(text)
+        if group is None:
+            group = _parse_group(text, cache)
+        if group:
+            groups.append(group)
+            # Only groups without alternatives are hard dependencies
+            if len(group) == 1:
+                hard.append(group[0].name)
+    result = cache[value] = (tuple(groups), hard)
+    return result
+
+
+def _parse_provides(value: bytes, cache: Dict) -> Tuple[Relation, ...]:
+    key = b"Provides:" + value
+    result = cache.get(key)
+    if result is None:
+        result = cache[key] = tuple(group[0] for group in _parse_field(value, cache)[0])
+    return result
+
+
+def iter_blocks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Regroup arbitrary byte chunks into blocks that only hold whole stanzas.
+    Every block starts with a newline and ends with a blank line.
+    """
+    pending = b"\n"
+    for chunk in chunks:
+        data = pending + chunk
+        end = data.rfind(b"\n\n")
+        if end == -1:
+            pending = data
+            continue
+        yield data[:end + 2]
+        pending = data[end + 1:]
+    if pending.strip():
+        yield pending + b"\n\n"
+
+
+def _parse_block(block: bytes, cache: Dict) -> List[PackageInfo]:
+    packages = []
+    name = version = depends = pre_depends = provides = None
+    # split() rather than findall() gives the captured fields as one flat list
+    # (with the skipped text in between), no tuple is allocated per match
+    parts = _FIELD_RE.split(block)
+    for field, value in zip(parts[1::3], parts[2::3]):
+        if field:
+            if b"\n" in value:
+                # Continuation lines are joined into one line
+                value = value.replace(b"\n", b" ")
+            if field == b"Package":
+                name = value
+            elif field == b"Version":
+                version = value
+            elif field == b"Depends":
+                depends = value
+            elif field == b"Pre-Depends":
+                pre_depends = value
+            else:
+                provides = value
+            continue
+
+        # End of the stanza
+        if name:
+            info = PackageInfo(name.strip().decode('utf-8'), set())
+            if version:
+                info.version = version.strip().decode('utf-8')
+            if depends:
+                info.depends_relations, hard = _parse_field(depends, cache)
+                info.depends.update(hard)
+            if pre_depends:
+                info.pre_depends, hard = _parse_field(pre_depends, cache)
+                info.depends.update(hard)
+            if provides:
+                info.provides = _parse_provides(provides, cache)
+            packages.append(info)
+        name = version = depends = pre_depends = provides = None
+    return packages
+
+
+def parse_packages(chunks: Iterable[bytes]) -> Iterator[PackageInfo]:
+    """Parse a Packages file given as byte chunks, yielding packages one by one."""
+    # Relation groups ("libc6 (>= 2.34)") and often whole fields repeat across
+    # thousands of packages, each distinct text is parsed once and then shared
+    cache: Dict = {}
+    for block in iter_blocks(chunks):
+        yield from _parse_block(block, cache)
+
+
+def read_chunks(stream, size: int = 1 << 20) -> Iterator[bytes]:
+    """Read a binary stream in blocks of `size` bytes until it ends."""
+    return iter(lambda: stream.read(size), b"")
@@ -1,78 +1,95 @@
-from typing import Dict, Set
+from typing import Dict, FrozenSet, Iterable, Iterator, Set, TextIO, Tuple
+import io
 import logging
+from collections import deque
+from src.emitters import EMITTERS, MermaidEmitter, emit_graph
 from src.repo_manager import RepositoryManager
 
 class DependencyAnalyzer:
     def __init__(self, max_depth: int):
         self.max_depth = max_depth
         self.dependencies: Dict[str, Set[str]] = {}
+        # Shallowest depth of every package reached by the last analysis
+        self.depths: Dict[str, int] = {}
         self.repo_manager = RepositoryManager()
         self.debug_mode = False
+        # Follow reverse dependencies: what needs a package instead of what it needs
+        self.reverse = False
+        # Direct dependencies, shared by all analyses. Bounded by the repository size
+        self.direct_cache: Dict[str, Set[str]] = {}
+
+    def direct_dependencies(self, package: str) -> Set[str]:
+        direct_deps = self.direct_cache.get(package)
+        if direct_deps is None:
+            if self.reverse:
+                direct_deps = self.repo_manager.get_reverse_dependencies(package)
+            else:
+                direct_deps = self.repo_manager.get_package_dependencies(package)
+            if self.debug_mode:
+                logging.info(f"Package {package} has dependencies: {direct_deps}")
+            self.direct_cache[package] = direct_deps
+        return direct_deps
+
+    def clear_caches(self) -> None:
+        """Forget memoized lookups, after the repository data has changed."""
+        self.direct_cache.clear()
+
+    def walk(self, package: str, max_depth: int,
+             start_depth: int = 0) -> Tuple[Dict[str, Set[str]], Dict[str, int]]:
+        """
+        Breadth-first walk of package dependencies down to max_depth. Returns
+        the dependencies of every expanded package and the shallowest depth
+        of every package reached. Only direct lookups are memoized, so a walk
+        needs memory for its own graph and nothing is kept per root.
+        """
+        dependencies: Dict[str, Set[str]] = {}
+        depths = {package: start_depth}
+        queue = deque([package])
+        while queue:
+            pkg = queue.popleft()
+            depth = depths[pkg]
+            if depth >= max_depth:
+                continue
+
+            direct_deps = dependencies[pkg] = self.direct_dependencies(pkg)
+            for dep in direct_deps:
+                if dep not in depths:
+                    depths[dep] = depth + 1
+                    queue.append(dep)
+        return dependencies, depths
 
     def analyze_dependencies(self, package: str, current_depth: int = 0) -> None:
-        """Recursively analyze package dependencies up to max_depth."""
-        if current_depth >= self.max_depth or package in self.dependencies:
-            return
-            
-        direct_deps = self.repo_manager.get_package_dependencies(package)
-        if self.debug_mode:
-            logging.info(f"Package {package} has dependencies: {direct_deps}")
-            
-        self.dependencies[package] = direct_deps
-        
-        for dep in direct_deps:
-            self.analyze_dependencies(dep, current_depth + 1)
+        """
+        Breadth-first walk of package dependencies up to max_depth.
+        Every package is expanded once, at the shallowest depth it's reached.
+        """
+        dependencies, self.depths = self.walk(package, self.max_depth, current_depth)
+        self.dependencies.update(dependencies)
+
+    def closure(self, package: str, depth: int) -> FrozenSet[str]:
+        """Packages reachable from package in at most depth steps, package included."""
+        return frozenset(self.walk(package, depth)[1])
+
+    def analyze_package(self, package: str) -> Tuple[Dict[str, Set[str]], Dict[str, int]]:
+        """Dependency graph and depths of one package up to max_depth."""
+        return self.walk(package, self.max_depth)
+
+    def analyze_batch(self, packages: Iterable[str]) -> Iterator[Tuple[str, Dict[str, Set[str]], Dict[str, int]]]:
+        """Analyze many packages against the once loaded repository."""
+        for package in packages:
+            dependencies, depths = self.analyze_package(package)
+            yield package, dependencies, depths
 
     def sanitize_node_id(self, name: str) -> str:
         """Sanitize package name for use as node ID in Mermaid."""
-        return name.replace('-', '_').replace('.', '_').replace('+', 'plus')
+        return MermaidEmitter.node_id(name)
+
+    def write_graph(self, stream: TextIO, format: str = "mermaid") -> None:
+        """Write the analyzed graph to a text stream in one of the EMITTERS formats."""
+        emit_graph(EMITTERS[format](stream), self.dependencies)
 
     def generate_mermaid(self) -> str:
         """Generate Mermaid graph description."""
-        if not self.dependencies:
-            return "graph LR\n    A[No dependencies found]"
-
-        mermaid_lines = ["graph LR"]
-        visited_edges = set()
-        
-        # Add nodes first
-        nodes = set()
-        for package in self.dependencies.keys():
-            nodes.add(package)
-            nodes.update(self.dependencies[package])
-        
-        # Calculate depth for each node
-        depths: Dict[str, int] = {}
-        
-        def calculate_depth(pkg: str, depth: int = 0) -> None:
-            if pkg not in depths or depth < depths[pkg]:
-                depths[pkg] = depth
-                if pkg in self.dependencies:
-                    for dep in self.dependencies[pkg]:
-                        calculate_depth(dep, depth + 1)
-        
-        # Calculate depths starting from root package
-        root_package = list(self.dependencies.keys())[0]
-        calculate_depth(root_package)
-        
-        # Add nodes with style based on depth
-        for node in sorted(nodes):
-            node_id = self.sanitize_node_id(node)
-            depth = depths.get(node, 0)
-            # Более светлые оттенки для большей глубины
-            color = f"#{'f' * (depth + 1)}{'e' * (11 - depth)}"
-            mermaid_lines.append(f'    {node_id}["{node}"]')
-            mermaid_lines.append(f'    style {node_id} fill:{color}')
-        
-        # Add edges
-        for package, deps in sorted(self.dependencies.items()):
-            pkg_id = self.sanitize_node_id(package)
-            for dep in sorted(deps):
-                dep_id = self.sanitize_node_id(dep)
-                edge = f"{pkg_id}-->{dep_id}"
-                if edge not in visited_edges:
-                    mermaid_lines.append(f"    {pkg_id} --> {dep_id}")
-                    visited_edges.add(edge)
-        
-        return "\n".join(mermaid_lines)
-    
\ No newline at end of file
+        stream = io.StringIO()
+        self.write_graph(stream)
+        return stream.getvalue().rstrip("\n")
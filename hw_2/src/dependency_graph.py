@@ -0,0 +1,160 @@
+from array import array
+from typing import Dict, Iterable, List, Mapping, Optional, Set
+
+from src.common.package_info import PackageInfo
+
+
+class DependencyGraph:
+    """
+    Dependency graph in compressed sparse row form.
+
+    Package names are interned to consecutive integer IDs. The dependencies
+    of package `i` are `targets[offsets[i]:offsets[i + 1]]`, the reverse
+    adjacency has the same layout. Packages from the index get the lowest
+    IDs, names that only appear as dependencies (virtual packages, packages
+    from other components) follow them and have no dependencies of their own.
+
+    The arrays are never modified. update() records changed rows in small
+    override dicts that are consulted before the arrays, so an index refresh
+    touching a few packages doesn't rebuild the whole graph.
+    """
+
+    def __init__(self, names: List[str], package_count: int,
+                 offsets: array, targets: array):
+        self.names = names
+        self.ids: Dict[str, int] = {name: i for i, name in enumerate(names)}
+        self.package_count = package_count
+        self.offsets = offsets
+        self.targets = targets
+        self.reverse_offsets, self.reverse_targets = self._transpose()
+        # Rows replaced by update(), by ID
+        self.overrides: Dict[int, array] = {}
+        self.reverse_overrides: Dict[int, array] = {}
+        # Packages update() added to or removed from the index
+        self.added: Set[int] = set()
+        self.removed: Set[int] = set()
+
+    @classmethod
+    def from_packages(cls, packages: Dict[str, PackageInfo]) -> "DependencyGraph":
+        names = list(packages)
+        ids = {name: i for i, name in enumerate(names)}
+        offsets = array('I', [0])
+        targets = array('I')
+        for info in packages.values():
+            dep_ids = []
+            for dep in info.depends:
+                dep_id = ids.get(dep)
+                if dep_id is None:
+                    dep_id = ids[dep] = len(names)
+                    names.append(dep)
+                dep_ids.append(dep_id)
+            dep_ids.sort()
+            targets.extend(dep_ids)
+            offsets.append(len(targets))
+        # Names known only as dependencies have empty rows
+        offsets.extend([len(targets)] * (len(names) - len(packages)))
+        return cls(names, len(packages), offsets, targets)
+
+    def _transpose(self):
+        counts = array('I', [0]) * (len(self.names) + 1)
+        for target in self.targets:
+            counts[target + 1] += 1
+        reverse_offsets = array('I', [0]) * (len(self.names) + 1)
+        total = 0
+        for i in range(len(self.names)):
+            total += counts[i + 1]
+            reverse_offsets[i + 1] = total
+
+        # Filling sources in ID order keeps every reverse row sorted
+        reverse_targets = array('I', [0]) * len(self.targets)
+        position = reverse_offsets[:-1]
+        offsets = self.offsets
+        for source in range(len(self.names)):
+            for k in range(offsets[source], offsets[source + 1]):
+                target = self.targets[k]
+                reverse_targets[position[target]] = source
+                position[target] += 1
+        return reverse_offsets, reverse_targets
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.ids
+
+    def id_of(self, name: str) -> Optional[int]:
+        return self.ids.get(name)
+
+    def is_package(self, name: str) -> bool:
+        """Whether `name` has a stanza in the index, not just appears as a dependency."""
+        package_id = self.ids.get(name)
+        if package_id is None:
+            return False
+        if package_id < self.package_count:
+            return package_id not in self.removed
+        return package_id in self.added
+
+    def dependency_ids(self, package_id: int) -> Iterable[int]:
+        row = self.overrides.get(package_id)
+        if row is not None:
+            return row
+        if package_id + 1 >= len(self.offsets):
+            return ()
+        return self.targets[self.offsets[package_id]:self.offsets[package_id + 1]]
+
+    def reverse_dependency_ids(self, package_id: int) -> Iterable[int]:
+        row = self.reverse_overrides.get(package_id)
+        if row is not None:
+            return row
+        if package_id + 1 >= len(self.reverse_offsets):
+            return ()
+        return self.reverse_targets[self.reverse_offsets[package_id]:self.reverse_offsets[package_id + 1]]
+
+    def _intern(self, name: str) -> int:
+        package_id = self.ids.get(name)
+        if package_id is None:
+            package_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return package_id
+
+    def update(self, changes: Mapping[str, Optional[PackageInfo]]) -> None:
+        """
+        Replace the dependencies of changed packages, None removes a package.
+        Reverse rows of the dependencies that were gained or lost follow along.
+        """
+        for name, info in changes.items():
+            package_id = self._intern(name)
+            old = set(self.dependency_ids(package_id))
+            new = {self._intern(dep) for dep in info.depends} if info else set()
+
+            if info is None:
+                self.removed.add(package_id)
+                self.added.discard(package_id)
+            elif package_id >= self.package_count:
+                self.added.add(package_id)
+            else:
+                self.removed.discard(package_id)
+            if old == new:
+                continue
+
+            self.overrides[package_id] = array('I', sorted(new))
+            for target in old ^ new:
+                sources = set(self.reverse_dependency_ids(target))
+                if target in new:
+                    sources.add(package_id)
+                else:
+                    sources.discard(package_id)
+                self.reverse_overrides[target] = array('I', sorted(sources))
+
+    def dependencies(self, name: str) -> Set[str]:
+        package_id = self.ids.get(name)
+        if package_id is None:
+            return set()
+        return {self.names[i] for i in self.dependency_ids(package_id)}
+
+    def reverse_dependencies(self, name: str) -> Set[str]:
+        """Packages that depend on `name` directly."""
+        package_id = self.ids.get(name)
+        if package_id is None:
+            return set()
+        return {self.names[i] for i in self.reverse_dependency_ids(package_id)}
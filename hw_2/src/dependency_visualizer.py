@@ -1,19 +1,86 @@
 import os
+import shutil
+import hashlib
 import logging
 import tempfile
+import threading
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+# Visualizer processes running at once in visualize_many
+DEFAULT_WORKERS = 4
 
 class DependencyVisualizer:
-    def __init__(self, visualizer_path: str):
+    def __init__(self, visualizer_path: str, cache_dir: Optional[str] = None):
         self.visualizer_path = visualizer_path
-        
-    def visualize(self, mermaid_content: str) -> None:
+        # Rendered images are kept here by content hash, identical graphs are rendered once
+        self.cache_dir = cache_dir
+
+    def visualize(self, mermaid_content: str, output_path: Optional[str] = None) -> Optional[str]:
         """Visualize the Mermaid graph using external visualizer."""
-        with open('temp.mmd', mode='w+') as f:
-            f.write(mermaid_content)
-            temp_file = f.name
         print(mermaid_content)
-        try:
-            subprocess.run([self.visualizer_path, '-i', temp_file], check=True)
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Failed to visualize graph: {e}")
+        return self.render(mermaid_content, output_path)
+
+    def render(self, mermaid_content: str, output_path: Optional[str] = None) -> Optional[str]:
+        """
+        Render a diagram, through the cache if there is one.
+        Returns the path of the image, None if the visualizer failed
+        or decides itself where to put it.
+        """
+        if not self.cache_dir:
+            return output_path if self._run(mermaid_content, output_path) else None
+
+        digest = hashlib.sha256(mermaid_content.encode('utf-8')).hexdigest()
+        cached_path = os.path.join(self.cache_dir, f"{digest}.svg")
+        if not os.path.exists(cached_path):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Rendered next to the final name and moved, readers never see a partial image
+            partial_path = os.path.join(self.cache_dir, f"{digest}.{os.getpid()}-{threading.get_ident()}.svg")
+            if not self._run(mermaid_content, partial_path):
+                return None
+            os.replace(partial_path, cached_path)
+
+        if output_path:
+            shutil.copyfile(cached_path, output_path)
+            return output_path
+        return cached_path
+
+    def _run(self, mermaid_content: str, output_path: Optional[str]) -> bool:
+        # A unique file per call, so concurrent renders don't overwrite each other's input
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.mmd') as f:
+            f.write(mermaid_content)
+            f.flush()
+            command = [self.visualizer_path, '-i', f.name]
+            if output_path:
+                command += ['-o', output_path]
+            try:
+                subprocess.run(command, check=True)
+            except (OSError, subprocess.CalledProcessError) as e:
+                logging.error(f"Failed to visualize graph: {e}")
+                return False
+        return True
+
+    def visualize_many(self, contents: Sequence[str], output_paths: Sequence[str],
+                       workers: int = DEFAULT_WORKERS) -> List[Optional[str]]:
+        """
+        Render many diagrams to the given paths with at most `workers`
+        visualizer processes at a time. Identical diagrams are rendered once.
+        """
+        first: Dict[str, int] = {}
+        for i, content in enumerate(contents):
+            first.setdefault(content, i)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            rendered = dict(zip(first.values(), executor.map(
+                lambda i: self.render(contents[i], output_paths[i]), first.values()
+            )))
+
+        results = []
+        for i, content in enumerate(contents):
+            source = rendered[first[content]]
+            if source is not None and i != first[content]:
+                shutil.copyfile(source, output_paths[i])
+                source = output_paths[i]
+            results.append(source)
+        return results
@@ -0,0 +1,163 @@
+import json
+from collections import deque
+from typing import Dict, Optional, Set, TextIO
+
+# Depth from which all nodes get the lightest colour
+MAX_SHADE_DEPTH = 5
+
+
+def depth_color(depth: int) -> str:
+    """Fill colour of a node, lighter for deeper nodes and white from MAX_SHADE_DEPTH on."""
+    shade = 0xaa + min(depth, MAX_SHADE_DEPTH) * 0x11
+    return f"#ff{shade:02x}{shade:02x}"
+
+
+class GraphEmitter:
+    """
+    Writes a dependency graph to a text stream as it's walked.
+    Subclasses implement the hooks, emit_graph calls them in order:
+    begin, node for every node, edges for every expanded package, end.
+    """
+    name = ""
+    extension = ""
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+
+    def empty(self) -> None:
+        raise NotImplementedError
+
+    def begin(self, root: str) -> None:
+        pass
+
+    def node(self, name: str, depth: int) -> None:
+        pass
+
+    def edges(self, source: str, targets: list) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+class MermaidEmitter(GraphEmitter):
+    name = "mermaid"
+    extension = "mmd"
+
+    @staticmethod
+    def node_id(name: str) -> str:
+        """Sanitize package name for use as node ID in Mermaid."""
+        return name.replace('-', '_').replace('.', '_').replace('+', 'plus')
+
+    def empty(self) -> None:
+        self.stream.write("graph LR\n    A[No dependencies found]\n")
+
+    def begin(self, root: str) -> None:
+        self.stream.write("graph LR\n")
+
+    def node(self, name: str, depth: int) -> None:
+        node_id = self.node_id(name)
+        self.stream.write(f'    {node_id}["{name}"]\n    style {node_id} fill:{depth_color(depth)}\n')
+
+    def edges(self, source: str, targets: list) -> None:
+        source_id = self.node_id(source)
+        self.stream.writelines(f"    {source_id} --> {self.node_id(target)}\n" for target in targets)
+
+
+class DotEmitter(GraphEmitter):
+    name = "dot"
+    extension = "dot"
+
+    def empty(self) -> None:
+        self.stream.write('digraph dependencies {\n    label="No dependencies found";\n}\n')
+
+    def begin(self, root: str) -> None:
+        self.stream.write("digraph dependencies {\n    rankdir=LR;\n    node [style=filled];\n")
+
+    def node(self, name: str, depth: int) -> None:
+        self.stream.write(f'    {json.dumps(name)} [fillcolor="{depth_color(depth)}"];\n')
+
+    def edges(self, source: str, targets: list) -> None:
+        source = json.dumps(source)
+        self.stream.writelines(f"    {source} -> {json.dumps(target)};\n" for target in targets)
+
+    def end(self) -> None:
+        self.stream.write("}\n")
+
+
+class JsonEmitter(GraphEmitter):
+    """{"root": ..., "depths": {name: depth}, "dependencies": {name: [names]}}"""
+    name = "json"
+    extension = "json"
+
+    def empty(self) -> None:
+        self.stream.write('{"root": null, "depths": {}, "dependencies": {}}\n')
+
+    def begin(self, root: str) -> None:
+        self.stream.write(f'{{"root": {json.dumps(root)}, "depths": {{')
+        self.separator = ""
+        self.in_nodes = True
+
+    def node(self, name: str, depth: int) -> None:
+        self.stream.write(f"{self.separator}{json.dumps(name)}: {depth}")
+        self.separator = ", "
+
+    def edges(self, source: str, targets: list) -> None:
+        if self.in_nodes:
+            self.stream.write('}, "dependencies": {')
+            self.separator = ""
+            self.in_nodes = False
+        self.stream.write(f"{self.separator}{json.dumps(source)}: {json.dumps(targets)}")
+        self.separator = ", "
+
+    def end(self) -> None:
+        self.stream.write('}, "dependencies": {}}\n' if self.in_nodes else "}}\n")
+
+
+EMITTERS = {emitter.name: emitter for emitter in (MermaidEmitter, DotEmitter, JsonEmitter)}
+
+
+def emit_graph(emitter: GraphEmitter, dependencies: Dict[str, Set[str]],
+               root: Optional[str] = None) -> None:
+    """
+    Write the graph of expanded packages and their dependencies in one
+    breadth-first pass, which also gives every node its shallowest depth.
+    Nodes come in BFS order from root (the first expanded package by
+    default) with dependencies sorted, so the same graph always gives the
+    same output.
+    """
+    if not dependencies:
+        emitter.empty()
+        return
+    if root is None:
+        root = next(iter(dependencies))
+
+    emitter.begin(root)
+    # Expanded packages in the order their edges are written
+    order = []
+    depths = {root: 0}
+    queue = deque([root])
+    # Packages the root doesn't reach, left over from earlier analyses, start their own walks
+    starts = iter(dependencies)
+    while True:
+        while queue:
+            pkg = queue.popleft()
+            depth = depths[pkg]
+            emitter.node(pkg, depth)
+            deps = dependencies.get(pkg)
+            if deps is None:
+                continue
+            order.append(pkg)
+            for dep in sorted(deps):
+                if dep not in depths:
+                    depths[dep] = depth + 1
+                    queue.append(dep)
+        start = next((pkg for pkg in starts if pkg not in depths), None)
+        if start is None:
+            break
+        depths[start] = 0
+        queue.append(start)
+
+    for pkg in order:
+        emitter.edges(pkg, sorted(dependencies[pkg]))
+    emitter.end()
@@ -0,0 +1,123 @@
+import os
+import gzip
+import marshal
+import hashlib
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterator, Optional
+
+from src.common.package_info import PackageInfo, Relation
+
+# Bumped whenever the stored record layout changes, older files are ignored
+FORMAT_VERSION = 4
+
+
+def _relation_record(relation: Relation) -> tuple:
+    return (relation.name, relation.op, relation.version)
+
+
+@dataclass
+class CachedIndex:
+    packages: Dict[str, PackageInfo]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    # SHA256 of the uncompressed Packages file, pdiffs are applied against it
+    sha256: Optional[str] = None
+
+
+class IndexCache:
+    """
+    On-disk cache of parsed Packages indexes, one marshal file per index.
+    The raw Packages file is kept next to it, gzipped, for applying pdiffs.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def path_for(self, url: str, distribution: str, component: str, architecture: str) -> str:
+        key = "\0".join((url, distribution, component, architecture)).encode('utf-8')
+        return os.path.join(self.cache_dir, hashlib.sha256(key).hexdigest()[:32] + ".idx")
+
+    def raw_path_for(self, url: str, distribution: str, component: str, architecture: str) -> str:
+        return self.path_for(url, distribution, component, architecture)[:-len(".idx")] + ".packages.gz"
+
+    def load_raw(self, url: str, distribution: str, component: str,
+                 architecture: str) -> Optional[bytes]:
+        """Return the cached uncompressed Packages file, or None if there isn't one."""
+        try:
+            with gzip.open(self.raw_path_for(url, distribution, component, architecture), 'rb') as f:
+                return f.read()
+        except (OSError, EOFError):
+            return None
+
+    @contextmanager
+    def raw_writer(self, url: str, distribution: str, component: str,
+                   architecture: str) -> Iterator[BinaryIO]:
+        """
+        Binary file to write the uncompressed Packages file to. It replaces
+        the cached one only if the block exits without an exception.
+        """
+        path = self.raw_path_for(url, distribution, component, architecture)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            # Fastest level, the file is rewritten on every refresh
+            with gzip.open(tmp_path, 'wb', compresslevel=1) as f:
+                yield f
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load(self, url: str, distribution: str, component: str,
+             architecture: str) -> Optional[CachedIndex]:
+        """Return the cached index, or None if it's missing, stale or unreadable."""
+        path = self.path_for(url, distribution, component, architecture)
+        try:
+            with open(path, 'rb') as f:
+                version, key, etag, last_modified, sha256, records = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if version != FORMAT_VERSION or key != [url, distribution, component, architecture]:
+            return None
+
+        # Most relations repeat across packages, share one object per distinct relation
+        relations: Dict[tuple, Relation] = {}
+
+        def relation(record: tuple) -> Relation:
+            result = relations.get(record)
+            if result is None:
+                result = relations[record] = Relation(*record)
+            return result
+
+        packages = {}
+        for name, version, depends, depends_relations, pre_depends, provides in records:
+            packages[name] = PackageInfo(
+                name, set(depends), version,
+                tuple(tuple(map(relation, group)) for group in depends_relations),
+                tuple(tuple(map(relation, group)) for group in pre_depends),
+                tuple(map(relation, provides))
+            )
+        return CachedIndex(packages, etag, last_modified, sha256)
+
+    def store(self, url: str, distribution: str, component: str, architecture: str,
+              index: CachedIndex) -> None:
+        path = self.path_for(url, distribution, component, architecture)
+        records = [
+            (name, info.version, sorted(info.depends),
+             [[_relation_record(r) for r in group] for group in info.depends_relations],
+             [[_relation_record(r) for r in group] for group in info.pre_depends],
+             [_relation_record(r) for r in info.provides])
+            for name, info in index.packages.items()
+        ]
+        data = (FORMAT_VERSION, [url, distribution, component, architecture],
+                index.etag, index.last_modified, index.sha256, records)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                marshal.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.error(f"Failed to write index cache {path}: {e}")
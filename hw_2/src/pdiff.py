@@ -0,0 +1,141 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.common.package_info import PackageInfo
+from src.control_parser import parse_packages
+
+# "123,125c", "45a", "67d"
+_COMMAND_RE = re.compile(rb'^(\d+)(?:,(\d+))?([acd])$')
+_PACKAGE_RE = re.compile(rb'^Package:[ \t]*(\S+)', re.MULTILINE)
+
+
+class PatchError(Exception):
+    pass
+
+
+@dataclass
+class PdiffIndex:
+    """Contents of a Packages.diff/Index file, hashes are SHA256 hex digests."""
+    current: str
+    # Hash of an older Packages file and the name of the patch made for it
+    history: List[Tuple[str, str]] = field(default_factory=list)
+    # Patch name to the hash of the uncompressed patch and of its .gz download
+    patches: Dict[str, str] = field(default_factory=dict)
+    downloads: Dict[str, str] = field(default_factory=dict)
+    # Merged patches each go straight from one old version to the current one
+    merged: bool = False
+
+
+def parse_pdiff_index(text: str) -> PdiffIndex:
+    current = ""
+    history = []
+    patches = {}
+    downloads = {}
+    merged = False
+    section = None
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        if line[0] in " \t":
+            parts = line.split()
+            if len(parts) != 3:
+                continue
+            digest, _, name = parts
+            if section == "SHA256-History":
+                history.append((digest, name))
+            elif section == "SHA256-Patches":
+                patches[name] = digest
+            elif section == "SHA256-Download":
+                downloads[name] = digest
+            continue
+
+        key, _, value = line.partition(":")
+        section = key
+        if key == "SHA256-Current":
+            current = value.split()[0]
+        elif key == "X-Patch-Precedence":
+            merged = value.strip() == "merged"
+    if not current:
+        raise PatchError("Index has no SHA256-Current")
+    return PdiffIndex(current, history, patches, downloads, merged)
+
+
+def patches_needed(index: PdiffIndex, digest: str) -> Optional[List[str]]:
+    """
+    Names of the patches that turn the file with `digest` into the current one,
+    in the order they're applied. None if the file is too old for the history.
+    """
+    if digest == index.current:
+        return []
+    for i, (old_digest, name) in enumerate(index.history):
+        if old_digest == digest:
+            if index.merged:
+                return [name]
+            return [patch for _, patch in index.history[i:]]
+    return None
+
+
+def apply_ed_patch(lines: List[bytes], patch: bytes) -> List[bytes]:
+    """
+    Apply a `diff --ed` script to a list of lines (with their line endings).
+    The commands come from the bottom of the file up, so line numbers of
+    later commands aren't shifted by earlier ones.
+    """
+    patch_lines = patch.splitlines(keepends=True)
+    i = 0
+    while i < len(patch_lines):
+        match = _COMMAND_RE.match(patch_lines[i].rstrip(b"\n"))
+        if not match:
+            raise PatchError(f"Bad ed command: {patch_lines[i]!r}")
+        start = int(match[1])
+        end = int(match[2]) if match[2] else start
+        command = match[3]
+        i += 1
+
+        text = []
+        if command != b"d":
+            while i < len(patch_lines) and patch_lines[i].rstrip(b"\n") != b".":
+                text.append(patch_lines[i])
+                i += 1
+            if i == len(patch_lines):
+                raise PatchError("Unterminated ed text")
+            i += 1
+
+        # "0a" inserts at the top, but there's no line 0 to change or delete
+        first = 0 if command == b"a" else 1
+        if start < first or end > len(lines) or start > end + (command == b"a"):
+            raise PatchError(f"Ed command outside the file: {match[0]!r}")
+        if command == b"a":
+            lines[start:start] = text
+        elif command == b"c":
+            lines[start - 1:end] = text
+        else:
+            del lines[start - 1:end]
+    return lines
+
+
+def _stanzas(data: bytes) -> Iterator[Tuple[bytes, bytes]]:
+    for stanza in data.split(b"\n\n"):
+        match = _PACKAGE_RE.search(stanza)
+        if match:
+            yield match[1], stanza.strip(b"\n")
+
+
+def diff_stanzas(old: bytes, new: bytes) -> Dict[str, Optional[PackageInfo]]:
+    """
+    Packages whose stanza differs between two Packages files: the newly
+    parsed record, or None for removed packages. Unchanged stanzas are
+    only compared, never parsed.
+    """
+    old_stanzas = dict(_stanzas(old))
+    changes: Dict[str, Optional[PackageInfo]] = {}
+    changed = []
+    for name, stanza in _stanzas(new):
+        if old_stanzas.pop(name, None) != stanza:
+            changed.append(stanza)
+    for info in parse_packages([b"\n\n".join(changed)]):
+        changes[info.name] = info
+    for name in old_stanzas:
+        changes[name.decode('utf-8')] = None
+    return changes
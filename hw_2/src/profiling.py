@@ -0,0 +1,106 @@
+import sys
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional, TextIO
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def max_rss() -> Optional[int]:
+    """Peak resident set size of the process in bytes, None where it's unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _TimedReader:
+    def __init__(self, profiler: "Profiler", stream: BinaryIO, name: str):
+        self.profiler = profiler
+        self.stream = stream
+        self.name = name
+
+    def read(self, *args) -> bytes:
+        with self.profiler.phase(self.name):
+            return self.stream.read(*args)
+
+    def __getattr__(self, attr):
+        return getattr(self.stream, attr)
+
+
+class Profiler:
+    """
+    Wall-clock time per pipeline phase, summed over calls and threads.
+
+    Phases nest: time spent in an inner phase is counted for it only, not
+    for the phase around it. That's what splits a streamed load, where
+    reading the download, decompressing and parsing alternate block by
+    block, into separate totals. With trace_memory, the peak of traced
+    Python allocations is recorded per phase too; tracing makes
+    everything several times slower.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.times: Dict[str, float] = {}
+        self.peaks: Dict[str, int] = {}
+        self.trace_memory = trace_memory
+        self.lock = threading.Lock()
+        # Per thread stack of [phase, start, time spent in inner phases]
+        self.local = threading.local()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        stack = self.local.__dict__.setdefault("stack", [])
+        frame = [name, time.perf_counter(), 0.0]
+        stack.append(frame)
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            stack.pop()
+            elapsed = time.perf_counter() - frame[1]
+            if stack:
+                stack[-1][2] += elapsed
+            with self.lock:
+                self.times[name] = self.times.get(name, 0.0) + elapsed - frame[2]
+                if self.trace_memory:
+                    peak = tracemalloc.get_traced_memory()[1]
+                    self.peaks[name] = max(self.peaks.get(name, 0), peak)
+
+    def timed_reader(self, stream: BinaryIO, name: str) -> BinaryIO:
+        """Wrap a binary stream so time spent in read() goes to phase `name`."""
+        return _TimedReader(self, stream, name)
+
+    def timed_iter(self, iterable: Iterable, name: str) -> Iterator:
+        """Yield from an iterable, counting the time to produce each item for phase `name`."""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def report(self, stream: TextIO = sys.stderr) -> None:
+        total = sum(self.times.values())
+        stream.write(f"{'phase':<12} {'time':>11} {'share':>6}" +
+                     (f" {'peak':>11}" if self.peaks else "") + "\n")
+        for name, seconds in self.times.items():
+            line = f"{name:<12} {seconds * 1000:8.1f} ms {seconds / total if total else 0:6.1%}"
+            if name in self.peaks:
+                line += f" {self.peaks[name] / 2**20:7.1f} MiB"
+            stream.write(line + "\n")
+        stream.write(f"{'total':<12} {total * 1000:8.1f} ms\n")
+        rss = max_rss()
+        if rss is not None:
+            stream.write(f"peak RSS     {rss / 2**20:8.1f} MiB\n")
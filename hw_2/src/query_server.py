@@ -0,0 +1,125 @@
+import io
+import json
+import socket
+import asyncio
+import logging
+from typing import Any, Dict, Tuple
+
+from src.emitters import EMITTERS, emit_graph
+from src.dependency_analyzer import DependencyAnalyzer
+
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+# Deepest walk a client may ask for
+MAX_QUERY_DEPTH = 32
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """Split "host:port" (or just "port") into its parts."""
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class QueryServer:
+    """
+    Answers dependency queries from a repository loaded once and kept in memory.
+
+    The protocol is JSON lines, one request object per line and one response
+    per line: {"op": "deps" | "rdeps" | "closure" | "graph" | "refresh",
+    "package": name, "depth": n, "reverse": bool, "format": name} gets
+    {"ok": true, "result": ...} or {"ok": false, "error": message}.
+    """
+
+    def __init__(self, analyzer: DependencyAnalyzer, max_query_depth: int = MAX_QUERY_DEPTH):
+        self.repo_manager = analyzer.repo_manager
+        self.max_depth = analyzer.max_depth
+        self.max_query_depth = max_query_depth
+        other = DependencyAnalyzer(analyzer.max_depth)
+        other.repo_manager = analyzer.repo_manager
+        other.debug_mode = analyzer.debug_mode
+        other.reverse = not analyzer.reverse
+        # Forward and reverse walks keep separate caches over the same graph
+        self.analyzers = {analyzer.reverse: analyzer, other.reverse: other}
+        # Held while a refresh changes the graph under the analyzers
+        self.lock = asyncio.Lock()
+
+    def handle(self, request: Dict[str, Any]) -> Any:
+        """Answer one query, raising ValueError for malformed ones."""
+        op = request.get("op")
+        package = request.get("package")
+        if not isinstance(package, str):
+            raise ValueError("package is required")
+        analyzer = self.analyzers[bool(request.get("reverse", False))]
+        depth = int(request.get("depth", self.max_depth))
+        if not 0 <= depth <= self.max_query_depth:
+            raise ValueError(f"depth must be between 0 and {self.max_query_depth}")
+
+        if op == "deps":
+            return sorted(self.analyzers[False].direct_dependencies(package))
+        if op == "rdeps":
+            return sorted(self.analyzers[True].direct_dependencies(package))
+        if op == "closure":
+            # One breadth-first walk, nothing is cached per depth
+            return sorted(analyzer.closure(package, depth) - {package})
+        if op == "graph":
+            format = request.get("format", "mermaid")
+            if format not in EMITTERS:
+                raise ValueError(f"Unknown format: {format}")
+            dependencies, _ = analyzer.walk(package, depth)
+            stream = io.StringIO()
+            emit_graph(EMITTERS[format](stream), dependencies, package)
+            return stream.getvalue()
+        raise ValueError(f"Unknown op: {op}")
+
+    def refresh(self) -> None:
+        self.repo_manager.refresh()
+        for analyzer in self.analyzers.values():
+            analyzer.clear_caches()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("Request must be a JSON object")
+                    async with self.lock:
+                        if request.get("op") == "refresh":
+                            # Downloads run off the event loop, queries wait for the new graph
+                            await asyncio.get_running_loop().run_in_executor(None, self.refresh)
+                            result = None
+                        else:
+                            result = self.handle(request)
+                    response = {"ok": True, "result": result}
+                except (ValueError, TypeError) as e:
+                    response = {"ok": False, "error": str(e)}
+                writer.write(json.dumps(response).encode('utf-8') + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, address: str = DEFAULT_ADDRESS) -> asyncio.AbstractServer:
+        """Load the repository and start listening, port 0 picks a free one."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.repo_manager.get_graph)
+        host, port = parse_address(address)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def serve(self, address: str = DEFAULT_ADDRESS) -> None:
+        server = await self.start(address)
+        logging.info(f"Serving dependency queries on {address}")
+        async with server:
+            await server.serve_forever()
+
+
+def query(address: str, request: Dict[str, Any], timeout: float = 60) -> Dict[str, Any]:
+    """Send one request to a running QueryServer and return its response."""
+    with socket.create_connection(parse_address(address), timeout=timeout) as sock:
+        with sock.makefile('rwb') as f:
+            f.write(json.dumps(request).encode('utf-8') + b"\n")
+            f.flush()
+            line = f.readline()
+    if not line:
+        raise ConnectionError(f"Server at {address} closed the connection")
+    return json.loads(line)
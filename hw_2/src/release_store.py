@@ -0,0 +1,132 @@
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from src.common.package_info import PackageInfo
+
+# Sorted dependency IDs of one package
+Row = Tuple[int, ...]
+
+
+class ReleaseView:
+    """
+    Dependencies of one release (a distribution on one architecture) in a
+    ReleaseStore. Only the first release holds every row, the others refer to
+    it as their base and keep just the rows that differ from it, with None
+    for packages the base has and this release doesn't.
+    """
+
+    def __init__(self, store: "ReleaseStore", name: str, base: Optional["ReleaseView"] = None):
+        self.store = store
+        self.name = name
+        self.base = base
+        self.rows: Dict[int, Optional[Row]] = {}
+        # Built on the first reverse lookup
+        self.reverse: Optional[Dict[int, List[int]]] = None
+
+    def row(self, package_id: int) -> Optional[Row]:
+        if package_id in self.rows:
+            return self.rows[package_id]
+        return self.base.row(package_id) if self.base else None
+
+    def package_ids(self) -> Iterator[int]:
+        if self.base:
+            for package_id in self.base.package_ids():
+                if package_id not in self.rows:
+                    yield package_id
+        for package_id, row in self.rows.items():
+            if row is not None:
+                yield package_id
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.package_ids())
+
+    def __contains__(self, name: str) -> bool:
+        package_id = self.store.ids.get(name)
+        return package_id is not None and self.row(package_id) is not None
+
+    def dependencies(self, name: str) -> Set[str]:
+        package_id = self.store.ids.get(name)
+        row = self.row(package_id) if package_id is not None else None
+        return {self.store.names[i] for i in row} if row else set()
+
+    def reverse_dependencies(self, name: str) -> Set[str]:
+        """Packages of this release that depend on `name` directly."""
+        if self.reverse is None:
+            self.reverse = {}
+            for package_id in self.package_ids():
+                for dep_id in self.row(package_id):
+                    self.reverse.setdefault(dep_id, []).append(package_id)
+        package_id = self.store.ids.get(name)
+        return {self.store.names[i] for i in self.reverse.get(package_id, ())}
+
+    def closure(self, name: str, depth: Optional[int] = None) -> Set[str]:
+        """Packages reachable from `name` in at most `depth` steps (unbounded by default), itself excluded."""
+        start = self.store.ids.get(name)
+        if start is None:
+            return set()
+        depths = {start: 0}
+        queue = deque([start])
+        while queue:
+            package_id = queue.popleft()
+            if depth is not None and depths[package_id] >= depth:
+                continue
+            for dep_id in self.row(package_id) or ():
+                if dep_id not in depths:
+                    depths[dep_id] = depths[package_id] + 1
+                    queue.append(dep_id)
+        del depths[start]
+        return {self.store.names[i] for i in depths}
+
+
+class ReleaseStore:
+    """
+    Dependency data of several releases sharing one set of interned names
+    and one pool of dependency rows. Releases mostly list the same packages
+    with the same dependencies, so what a release adds to memory is roughly
+    the number of packages it changes, not its size.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+        # Every distinct row once, identical dependency lists are the same object
+        self.row_pool: Dict[Row, Row] = {}
+        self.releases: Dict[str, ReleaseView] = {}
+
+    def intern(self, name: str) -> int:
+        package_id = self.ids.get(name)
+        if package_id is None:
+            package_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return package_id
+
+    def intern_row(self, names: Iterable[str]) -> Row:
+        row = tuple(sorted(map(self.intern, names)))
+        return self.row_pool.setdefault(row, row)
+
+    def add_release(self, name: str, packages: Dict[str, PackageInfo]) -> ReleaseView:
+        rows = {self.intern(package): self.intern_row(info.depends) for package, info in packages.items()}
+        base = next(iter(self.releases.values()), None)
+        view = ReleaseView(self, name, base)
+        if base is None:
+            view.rows = rows
+        else:
+            # Pooled rows are shared objects, identity tells whether a row changed
+            for package_id, row in rows.items():
+                if base.row(package_id) is not row:
+                    view.rows[package_id] = row
+            for package_id in base.package_ids():
+                if package_id not in rows:
+                    view.rows[package_id] = None
+        self.releases[name] = view
+        return view
+
+    def __getitem__(self, name: str) -> ReleaseView:
+        return self.releases[name]
+
+    def closure_diff(self, package: str, old: str, new: str,
+                     depth: Optional[int] = None) -> Tuple[Set[str], Set[str]]:
+        """Packages the closure of `package` gains and loses going from release `old` to `new`."""
+        before = self.releases[old].closure(package, depth)
+        after = self.releases[new].closure(package, depth)
+        return after - before, before - after
@@ -1,16 +1,25 @@
-import re
 import gzip
-import urllib
+import hashlib
 import logging
-from typing import Dict, Set
-from urllib.error import URLError
-from urllib.request import urlopen
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterable, Optional, Set, Tuple
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
 
 from src.common.repository import Repository
 from src.common.package_info import PackageInfo
+from src.dependency_graph import DependencyGraph
+from src.control_parser import parse_packages, paused_gc, read_chunks
+from src.index_cache import CachedIndex, IndexCache
+from src.release_store import ReleaseStore
+from src.profiling import Profiler
+from src.pdiff import PatchError, PdiffIndex, apply_ed_patch, diff_stanzas, parse_pdiff_index, patches_needed
+
+COMPONENTS = ["main", "universe"]
 
 class RepositoryManager:
-    def __init__(self):
+    def __init__(self, cache_dir: Optional[str] = None):
         # Default Ubuntu repository
         self.repository = Repository(
             name="ubuntu-main",
@@ -18,73 +27,267 @@ class RepositoryManager:
             distribution="jammy",  # Ubuntu 22.04 LTS
             component="main"
         )
-        self.packages_cache: Dict[str, PackageInfo] = {}
+        # Components merged into one index, all of them share the graph
+        self.components = list(COMPONENTS)
+        self.graph: Optional[DependencyGraph] = None
         self.debug_mode = False
-        
-    def download_packages_file(self) -> str:
-        """Download and decompress Packages.gz file from repository."""
-        components = ["main", "universe"]  # Добавляем universe компонент
-        content = ""
-        
-        for component in components:
-            packages_url = f"{self.repository.url}/dists/{self.repository.distribution}/{component}/binary-amd64/Packages.gz"
-            
-            if self.debug_mode:
-                logging.info(f"Downloading from: {packages_url}")
-                
-            try:
-                with urllib.request.urlopen(packages_url) as response:
-                    with gzip.GzipFile(fileobj=response) as gz_file:
-                        content += gz_file.read().decode('utf-8')
-            except URLError as e:
-                logging.error(f"Failed to download Packages file from {component}: {e}")
-                
-        return content
+        # Parsed indexes are kept on disk between runs when a cache directory is set
+        self.index_cache = IndexCache(cache_dir) if cache_dir else None
+        # What the last load changed: packages patched in by pdiffs,
+        # and whether any component had to be downloaded in full
+        self.changes: Dict[str, Optional[PackageInfo]] = {}
+        self.reloaded = False
+        # Collects per-phase timings of loads when set
+        self.profiler: Optional[Profiler] = None
+
+    def phase(self, name: str):
+        """Context timing a pipeline phase when profiling, a no-op otherwise."""
+        return self.profiler.phase(name) if self.profiler else nullcontext()
 
+    def index_key(self, component: str, distribution: Optional[str] = None,
+                  architecture: Optional[str] = None) -> Tuple[str, str, str, str]:
+        """Mirror, distribution, component and architecture of one index, the repository's by default."""
+        return (self.repository.url, distribution or self.repository.distribution,
+                component, architecture or self.repository.architecture)
+
+    def packages_url(self, component: str, distribution: Optional[str] = None,
+                     architecture: Optional[str] = None) -> str:
+        url, distribution, component, architecture = self.index_key(component, distribution, architecture)
+        return f"{url}/dists/{distribution}/{component}/binary-{architecture}/Packages.gz"
+
+    def pdiff_url(self, component: str, distribution: Optional[str] = None,
+                  architecture: Optional[str] = None) -> str:
+        url, distribution, component, architecture = self.index_key(component, distribution, architecture)
+        return f"{url}/dists/{distribution}/{component}/binary-{architecture}/Packages.diff"
+        
     def parse_packages_file(self, content: str) -> Dict[str, PackageInfo]:
         """Parse Packages file content and extract package information."""
-        packages: Dict[str, PackageInfo] = {}
-        current_package = ""
-        current_depends: Set[str] = set()
-
-        for line in content.splitlines():
-            if line.startswith("Package: "):
-                if current_package:
-                    packages[current_package] = PackageInfo(current_package, current_depends)
-                current_package = line.split("Package: ")[1].strip()
-                current_depends = set()
-            elif line.startswith("Depends: "):
-                # Parse dependencies, handling versions and alternatives
-                deps_str = line.split("Depends: ")[1]
-                # Split by comma and handle each dependency
-                for dep in deps_str.split(","):
-                    dep = dep.strip()
-                    # Extract package name without version or architecture constraints
-                    match = re.match(r'^([a-zA-Z0-9\-\.]+)(?:\s|$|\(|\[)', dep)
-                    if match:
-                        dep_name = match.group(1)
-                        if "|" not in dep:  # Skip alternative dependencies
-                            current_depends.add(dep_name)
-
-        # Add last package
-        if current_package:
-            packages[current_package] = PackageInfo(current_package, current_depends)
+        return {info.name: info for info in parse_packages([content.encode('utf-8')])}
+
+    def parse_packages_stream(self, stream: BinaryIO, hasher=None,
+                              raw: Optional[BinaryIO] = None) -> Dict[str, PackageInfo]:
+        """
+        Parse a compressed Packages stream block by block as it's downloaded.
+        The uncompressed data is also fed to `hasher` and copied to `raw` if given.
+        """
+        def chunks(gz_file):
+            blocks = read_chunks(gz_file)
+            if self.profiler:
+                blocks = self.profiler.timed_iter(blocks, "decompress")
+            for chunk in blocks:
+                if hasher or raw:
+                    with self.phase("cache"):
+                        if hasher:
+                            hasher.update(chunk)
+                        if raw:
+                            raw.write(chunk)
+                yield chunk
+
+        if self.profiler:
+            stream = self.profiler.timed_reader(stream, "download")
+        with gzip.GzipFile(fileobj=stream) as gz_file, self.phase("parse"):
+            return {info.name: info for info in parse_packages(chunks(gz_file))}
+
+    def download_patch(self, component: str, name: str, index: PdiffIndex,
+                       distribution: Optional[str] = None, architecture: Optional[str] = None) -> bytes:
+        """Download one pdiff and check it against the hashes in the index."""
+        with urlopen(f"{self.pdiff_url(component, distribution, architecture)}/{name}.gz") as response:
+            data = response.read()
+        expected = index.downloads.get(f"{name}.gz")
+        if expected and hashlib.sha256(data).hexdigest() != expected:
+            raise PatchError(f"Checksum mismatch for {name}.gz")
+        patch = gzip.decompress(data)
+        expected = index.patches.get(name)
+        if expected and hashlib.sha256(patch).hexdigest() != expected:
+            raise PatchError(f"Checksum mismatch for {name}")
+        return patch
+
+    def update_from_pdiffs(self, component: str, cached: CachedIndex, distribution: Optional[str] = None,
+                           architecture: Optional[str] = None) -> Optional[Dict[str, PackageInfo]]:
+        """
+        Bring a cached index up to date by applying the pdiffs published since
+        it was stored. Only changed stanzas are parsed again. Returns None
+        when that isn't possible and the full index has to be downloaded.
+        """
+        cache_key = self.index_key(component, distribution, architecture)
+        index_url = f"{self.pdiff_url(component, distribution, architecture)}/Index"
+        if self.debug_mode:
+            logging.info(f"Downloading from: {index_url}")
+        try:
+            with urlopen(index_url) as response:
+                index = parse_pdiff_index(response.read().decode('utf-8'))
+        except (URLError, PatchError, UnicodeDecodeError) as e:
+            if self.debug_mode:
+                logging.info(f"No usable pdiff index for {component}: {e}")
+            return None
+
+        names = patches_needed(index, cached.sha256)
+        if names is None:
+            if self.debug_mode:
+                logging.info(f"Cached index for {component} is older than its pdiff history")
+            return None
+        if not names:
+            if self.debug_mode:
+                logging.info(f"Cached index for {component} is up to date")
+            return cached.packages
+
+        old = self.index_cache.load_raw(*cache_key)
+        if old is None:
+            return None
+        lines = old.splitlines(keepends=True)
+        try:
+            for name in names:
+                if self.debug_mode:
+                    logging.info(f"Applying pdiff {name} to {component}")
+                patch = self.download_patch(component, name, index, distribution, architecture)
+                lines = apply_ed_patch(lines, patch)
+        except (OSError, PatchError) as e:
+            logging.error(f"Failed to apply pdiffs to {component}: {e}")
+            return None
+        new = b"".join(lines)
+        if hashlib.sha256(new).hexdigest() != index.current:
+            logging.error(f"Patched index for {component} doesn't match the published checksum")
+            return None
 
+        changes = diff_stanzas(old, new)
+        packages = dict(cached.packages)
+        for name, info in changes.items():
+            if info is None:
+                packages.pop(name, None)
+            else:
+                packages[name] = info
+        try:
+            with self.index_cache.raw_writer(*cache_key) as raw:
+                raw.write(new)
+        except OSError as e:
+            logging.error(f"Failed to write index cache for {component}: {e}")
+        # The validators belonged to the old Packages.gz
+        self.index_cache.store(*cache_key, CachedIndex(packages, None, None, index.current))
+        self.changes.update(changes)
+        return packages
+
+    def load_component(self, component: str, distribution: Optional[str] = None,
+                       architecture: Optional[str] = None) -> Dict[str, PackageInfo]:
+        """
+        Load one component's index. A cached copy is patched with pdiffs when
+        the mirror publishes them, otherwise revalidated with a conditional request.
+        """
+        packages_url = self.packages_url(component, distribution, architecture)
+        cache_key = self.index_key(component, distribution, architecture)
+        cached = None
+        if self.index_cache:
+            with self.phase("cache"):
+                cached = self.index_cache.load(*cache_key)
+        if cached and cached.sha256:
+            with self.phase("pdiff"):
+                packages = self.update_from_pdiffs(component, cached, distribution, architecture)
+            if packages is not None:
+                return packages
+
+        request = Request(packages_url)
+        if cached:
+            if cached.etag:
+                request.add_header('If-None-Match', cached.etag)
+            if cached.last_modified:
+                request.add_header('If-Modified-Since', cached.last_modified)
+
+        if self.debug_mode:
+            logging.info(f"Downloading from: {packages_url}")
+
+        hasher = hashlib.sha256() if self.index_cache else None
+        try:
+            with urlopen(request) as response, \
+                    (self.index_cache.raw_writer(*cache_key) if self.index_cache else nullcontext()) as raw:
+                packages = self.parse_packages_stream(response, hasher, raw)
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+        except HTTPError as e:
+            if e.code == 304 and cached:
+                if self.debug_mode:
+                    logging.info(f"Cached index for {component} is up to date")
+                return cached.packages
+            logging.error(f"Failed to download Packages file from {component}: {e}")
+            return cached.packages if cached else {}
+        except URLError as e:
+            logging.error(f"Failed to download Packages file from {component}: {e}")
+            # Stale data is better than none when the mirror is unreachable
+            return cached.packages if cached else {}
+
+        self.reloaded = True
+        if self.index_cache:
+            with self.phase("cache"):
+                self.index_cache.store(*cache_key, CachedIndex(packages, etag, last_modified, hasher.hexdigest()))
+        return packages
+
+    def load_components(self, distribution: Optional[str] = None,
+                        architecture: Optional[str] = None) -> Dict[str, PackageInfo]:
+        """All components of one distribution and architecture merged into one index."""
+        # Downloads are I/O bound, so the whole load takes about as long as the slowest component.
+        # The collector is paused once around all of them rather than by each parsing thread
+        with paused_gc(), ThreadPoolExecutor(max_workers=len(self.components)) as executor:
+            results = list(executor.map(
+                lambda component: self.load_component(component, distribution, architecture),
+                self.components
+            ))
+
+        packages: Dict[str, PackageInfo] = {}
+        for component_packages in results:
+            packages.update(component_packages)
         return packages
 
     def load_repository_data(self) -> None:
         """Load and parse repository data."""
-        content = self.download_packages_file()
-        if content:
-            self.packages_cache = self.parse_packages_file(content)
+        packages = self.load_components()
+        if packages:
+            # Only the graph is kept, the parsed records are dropped once it's built
+            with self.phase("graph"):
+                self.graph = DependencyGraph.from_packages(packages)
         else:
             logging.error("Failed to load repository data")
 
+    def load_releases(self, releases: Iterable[Tuple[str, str]]) -> ReleaseStore:
+        """
+        Load the given (distribution, architecture) pairs into one store,
+        named "<distribution>/<architecture>". Releases are added one at a
+        time, so only one release's parsed records are held at once.
+        """
+        store = ReleaseStore()
+        for distribution, architecture in releases:
+            packages = self.load_components(distribution, architecture)
+            if not packages:
+                logging.error(f"Failed to load {distribution}/{architecture}")
+            store.add_release(f"{distribution}/{architecture}", packages)
+        return store
+
+    def refresh(self) -> None:
+        """
+        Bring loaded repository data up to date. When pdiffs covered every
+        change the graph is updated in place instead of being rebuilt.
+        """
+        if self.graph is None:
+            self.load_repository_data()
+            return
+        self.changes = {}
+        self.reloaded = False
+        packages = self.load_components()
+        if self.reloaded:
+            if packages:
+                self.graph = DependencyGraph.from_packages(packages)
+        elif self.changes:
+            self.graph.update(self.changes)
+
+    def get_graph(self) -> Optional[DependencyGraph]:
+        """Dependency graph of the repository, loaded on first use."""
+        if self.graph is None:
+            self.load_repository_data()
+        return self.graph
+
     def get_package_dependencies(self, package: str) -> Set[str]:
         """Get dependencies for a package from loaded repository data."""
-        if not self.packages_cache:
-            self.load_repository_data()
-            
-        if package in self.packages_cache:
-            return self.packages_cache[package].depends
-        return set()
+        graph = self.get_graph()
+        return graph.dependencies(package) if graph else set()
+
+    def get_reverse_dependencies(self, package: str) -> Set[str]:
+        """Get packages that depend on a package directly."""
+        graph = self.get_graph()
+        return graph.reverse_dependencies(package) if graph else set()
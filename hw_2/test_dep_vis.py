@@ -1,10 +1,33 @@
+import gc
+import io
+import os
+import re
+import time
 import gzip
+import json
+import asyncio
+import hashlib
+import shutil
+import tempfile
+import threading
 import unittest
+from difflib import SequenceMatcher
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch, MagicMock
 from src.repo_manager import RepositoryManager
+from src.common.repository import Repository
+from src.common.package_info import PackageInfo, Relation
+from src.dependency_graph import DependencyGraph
+from src.emitters import EMITTERS, emit_graph
+from src.control_parser import parse_packages, parse_relation
+from src.pdiff import PatchError, apply_ed_patch, parse_pdiff_index, patches_needed
 from src.dependency_analyzer import DependencyAnalyzer
 from src.dependency_visualizer import DependencyVisualizer
+from src.query_server import QueryServer, query
+from src.release_store import ReleaseStore
+from src.profiling import Profiler
 import subprocess
+from urllib.error import URLError
 
 
 class TestRepositoryManager(unittest.TestCase):
@@ -43,6 +66,380 @@ Depends: lib1, lib5
         self.assertEqual(packages["pkg1"].depends, {"lib1", "lib2"})
         self.assertEqual(packages["pkg2"].depends, {"lib1", "lib5"})
 
+    def test_parse_packages_stream(self):
+        stream = io.BytesIO(self.create_mock_packages_content("main"))
+        packages = self.repo_manager.parse_packages_stream(stream)
+
+        self.assertEqual(set(packages), {"test-package-main", "lib1", "lib2"})
+        self.assertEqual(packages["test-package-main"].depends, {"lib1", "lib2"})
+        self.assertEqual(packages["lib2"].depends, {"lib6"})
+
+
+class TestControlParser(unittest.TestCase):
+    CONTENT = (b"Package: pkg1\n"
+               b"Version: 1.0-1\n"
+               b"Pre-Depends: libc6 (>= 2.34)\n"
+               b"Depends: lib1, lib2 (>= 1.0),\n"
+               b" lib3 | lib4 (<< 2), python3:any [amd64] <!nocheck>,\n"
+               b" perl:any (>= 5.30~), libfoo:amd64(= 1.0)\n"
+               b"Provides: virtual-pkg (= 1.0), other-pkg\n"
+               b"Description: test\n"
+               b" Depends: not-a-field\n"
+               b"\n"
+               b"Package: pkg2\n"
+               b"Depends: lib1\n")
+
+    def test_relations(self):
+        packages = {info.name: info for info in parse_packages([self.CONTENT])}
+
+        pkg1 = packages["pkg1"]
+        self.assertEqual(pkg1.version, "1.0-1")
+        self.assertEqual(pkg1.depends, {"libc6", "lib1", "lib2", "python3", "perl", "libfoo"})
+        self.assertEqual(pkg1.pre_depends, ((Relation("libc6", ">=", "2.34"),),))
+        self.assertEqual(pkg1.depends_relations[1], (Relation("lib2", ">=", "1.0"),))
+        self.assertEqual(pkg1.depends_relations[2], (Relation("lib3"), Relation("lib4", "<<", "2")))
+        self.assertEqual(pkg1.depends_relations[3], (Relation("python3"),))
+        self.assertEqual(pkg1.depends_relations[4], (Relation("perl", ">=", "5.30~"),))
+        self.assertEqual(pkg1.depends_relations[5], (Relation("libfoo", "=", "1.0"),))
+        self.assertEqual(parse_relation("python3:any (>= 3.x~)"), Relation("python3", ">=", "3.x~"))
+        self.assertEqual(pkg1.provides, (Relation("virtual-pkg", "=", "1.0"), Relation("other-pkg")))
+        self.assertEqual(packages["pkg2"].depends, {"lib1"})
+
+    def test_chunk_boundaries(self):
+        expected = list(parse_packages([self.CONTENT]))
+        for size in (1, 7, 64):
+            chunks = [self.CONTENT[i:i + size] for i in range(0, len(self.CONTENT), size)]
+            self.assertEqual(list(parse_packages(chunks)), expected)
+
+
+def ed_script(old: bytes, new: bytes) -> bytes:
+    """A `diff --ed` script turning `old` into `new`, bottom-up like diff writes it."""
+    a = old.splitlines(keepends=True)
+    b = new.splitlines(keepends=True)
+    script = []
+    for tag, i1, i2, j1, j2 in reversed(SequenceMatcher(None, a, b, autojunk=False).get_opcodes()):
+        if tag == 'equal':
+            continue
+        lines = f"{i1 + 1},{i2}" if i2 - i1 > 1 else f"{i1 + 1}"
+        if tag == 'insert':
+            script.append(f"{i1}a\n".encode())
+        else:
+            script.append(f"{lines}{'d' if tag == 'delete' else 'c'}\n".encode())
+        if tag != 'delete':
+            script += b[j1:j2] + [b".\n"]
+    return b"".join(script)
+
+
+class MockRepositoryHandler(BaseHTTPRequestHandler):
+    """
+    Serves the same Packages.gz for every component, honouring ETags,
+    and any other file put in `files` by path.
+    """
+    content = b""
+    etag = '"v1"'
+    files = {}
+    requests = []
+
+    def do_GET(self):
+        MockRepositoryHandler.requests.append(self.path)
+        body = self.files.get(self.path)
+        if body is not None or not self.path.endswith("/Packages.gz"):
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = gzip.compress(self.content)
+        self.send_response(200)
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestIndexCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), MockRepositoryHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        MockRepositoryHandler.content = b"Package: pkg1\nDepends: lib1, lib2\n\nPackage: lib1\n"
+        MockRepositoryHandler.etag = '"v1"'
+        MockRepositoryHandler.files = {}
+        MockRepositoryHandler.requests = []
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def create_manager(self) -> RepositoryManager:
+        manager = RepositoryManager(cache_dir=self.cache_dir)
+        manager.repository = Repository("local", f"http://127.0.0.1:{self.server.server_port}", "jammy", "main")
+        return manager
+
+    def test_warm_run_uses_cache(self):
+        self.create_manager().load_repository_data()
+
+        manager = self.create_manager()
+        with patch.object(RepositoryManager, 'parse_packages_stream') as mock_parse:
+            manager.load_repository_data()
+            mock_parse.assert_not_called()
+        self.assertEqual(manager.get_package_dependencies("pkg1"), {"lib1", "lib2"})
+        downloads = [path for path in MockRepositoryHandler.requests if path.endswith("/Packages.gz")]
+        self.assertEqual(len(downloads), 4)
+        self.assertIn("/dists/jammy/universe/binary-amd64/Packages.gz", downloads)
+
+    def test_changed_index_is_downloaded(self):
+        self.create_manager().load_repository_data()
+        MockRepositoryHandler.content = b"Package: pkg1\nDepends: lib3\n"
+        MockRepositoryHandler.etag = '"v2"'
+
+        manager = self.create_manager()
+        manager.load_repository_data()
+        self.assertEqual(manager.get_package_dependencies("pkg1"), {"lib3"})
+        self.assertNotIn("lib1", manager.graph)
+
+    def test_unreachable_mirror_falls_back_to_cache(self):
+        self.create_manager().load_repository_data()
+
+        manager = self.create_manager()
+        manager.repository.url = "http://127.0.0.1:1"
+        self.assertEqual(manager.get_package_dependencies("pkg1"), set())
+
+        manager = self.create_manager()
+        with patch('src.repo_manager.urlopen', side_effect=URLError("offline")):
+            self.assertEqual(manager.get_package_dependencies("pkg1"), {"lib1", "lib2"})
+
+
+    def test_concurrent_loads_leave_gc_enabled(self):
+        # Every component in its own pool thread, several loads at once
+        manager = self.create_manager()
+        manager.components = ["main", "universe", "multiverse", "restricted"]
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(manager.load_components()))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([packages["pkg1"].depends for packages in results], [{"lib1", "lib2"}] * 4)
+        self.assertTrue(gc.isenabled())
+
+    def publish(self, content: bytes, current=None) -> None:
+        """Serve `content` as the new index with a pdiff from the current one."""
+        patch = ed_script(MockRepositoryHandler.content, content)
+        compressed = gzip.compress(patch)
+        old_digest = hashlib.sha256(MockRepositoryHandler.content).hexdigest()
+        index = (
+            f"SHA256-Current: {current or hashlib.sha256(content).hexdigest()} {len(content)}\n"
+            f"SHA256-History:\n {old_digest} 0 T-1\n"
+            f"SHA256-Patches:\n {hashlib.sha256(patch).hexdigest()} {len(patch)} T-1\n"
+            f"SHA256-Download:\n {hashlib.sha256(compressed).hexdigest()} {len(compressed)} T-1.gz\n"
+        ).encode()
+        for component in ("main", "universe"):
+            base = f"/dists/jammy/{component}/binary-amd64/Packages.diff"
+            MockRepositoryHandler.files[f"{base}/Index"] = index
+            MockRepositoryHandler.files[f"{base}/T-1.gz"] = compressed
+        MockRepositoryHandler.content = content
+        MockRepositoryHandler.etag = '"v2"'
+
+    def test_pdiffs_update_index_and_graph(self):
+        MockRepositoryHandler.content = (b"Package: pkg1\nDepends: lib1, lib2\n\n"
+                                         b"Package: lib1\n\nPackage: pkg2\nDepends: lib1\n")
+        manager = self.create_manager()
+        manager.load_repository_data()
+        graph = manager.graph
+
+        self.publish(b"Package: pkg1\nDepends: lib3\n\nPackage: lib1\n\n"
+                     b"Package: pkg3\nDepends: lib1\n")
+        MockRepositoryHandler.requests = []
+        manager.refresh()
+        self.assertIs(manager.graph, graph)
+        self.assertEqual(manager.get_package_dependencies("pkg1"), {"lib3"})
+        self.assertEqual(manager.get_reverse_dependencies("lib1"), {"pkg3"})
+        self.assertEqual(manager.get_reverse_dependencies("lib3"), {"pkg1"})
+        self.assertFalse(graph.is_package("pkg2"))
+        self.assertTrue(graph.is_package("pkg3"))
+        self.assertFalse(any(path.endswith("/Packages.gz") for path in MockRepositoryHandler.requests))
+
+        # The patched index was cached, the next run is up to date without downloading anything
+        MockRepositoryHandler.requests = []
+        manager = self.create_manager()
+        with patch.object(RepositoryManager, 'parse_packages_stream') as mock_parse:
+            manager.load_repository_data()
+            mock_parse.assert_not_called()
+        self.assertEqual(manager.get_package_dependencies("pkg1"), {"lib3"})
+        self.assertNotIn("pkg2", manager.graph)
+        self.assertEqual(len(MockRepositoryHandler.requests), 2)
+
+    def test_bad_pdiff_falls_back_to_full_download(self):
+        self.create_manager().load_repository_data()
+        self.publish(b"Package: pkg1\nDepends: lib3\n", current="0" * 64)
+
+        manager = self.create_manager()
+        manager.load_repository_data()
+        self.assertEqual(manager.get_package_dependencies("pkg1"), {"lib3"})
+        self.assertIn("/dists/jammy/main/binary-amd64/Packages.gz", MockRepositoryHandler.requests)
+
+    def test_load_releases(self):
+        MockRepositoryHandler.files = {
+            "/dists/noble/main/binary-amd64/Packages.gz":
+                gzip.compress(b"Package: pkg1\nDepends: lib1, lib4\n\nPackage: lib4\n"),
+            "/dists/jammy/main/binary-arm64/Packages.gz":
+                gzip.compress(b"Package: pkg1\nDepends: lib1\n"),
+        }
+        manager = self.create_manager()
+        manager.components = ["main"]
+        store = manager.load_releases([("jammy", "amd64"), ("noble", "amd64"), ("jammy", "arm64")])
+
+        self.assertEqual(store["jammy/amd64"].dependencies("pkg1"), {"lib1", "lib2"})
+        self.assertEqual(store["noble/amd64"].dependencies("pkg1"), {"lib1", "lib4"})
+        self.assertEqual(store["jammy/arm64"].dependencies("pkg1"), {"lib1"})
+        self.assertEqual(store.closure_diff("pkg1", "jammy/amd64", "noble/amd64"), ({"lib4"}, {"lib2"}))
+        self.assertNotIn("/dists/noble/universe/binary-amd64/Packages.gz", MockRepositoryHandler.requests)
+        self.assertNotIn("/dists/noble/main/binary-arm64/Packages.gz", MockRepositoryHandler.requests)
+        self.assertEqual(list(store.releases), ["jammy/amd64", "noble/amd64", "jammy/arm64"])
+
+
+class TestProfiler(unittest.TestCase):
+    def test_nested_phases(self):
+        profiler = Profiler()
+        stream = profiler.timed_reader(io.BytesIO(b"data"), "download")
+        with patch('src.profiling.time.perf_counter', side_effect=[0.0, 1.0, 1.5, 3.0]):
+            with profiler.phase("parse"):
+                self.assertEqual(stream.read(), b"data")
+        self.assertEqual(profiler.times["download"], 0.5)
+        # Time spent downloading isn't counted for the phase around it
+        self.assertEqual(profiler.times["parse"], 2.5)
+
+        self.assertEqual(list(profiler.timed_iter(iter([b"a", b"b"]), "decompress")), [b"a", b"b"])
+        # Falsy items and None don't end the iteration
+        self.assertEqual(list(profiler.timed_iter([1, None, 0, 2], "other")), [1, None, 0, 2])
+        output = io.StringIO()
+        profiler.report(output)
+        self.assertRegex(output.getvalue(), r"download +500\.0 ms")
+        self.assertIn("decompress", output.getvalue())
+
+
+class TestPdiff(unittest.TestCase):
+    INDEX = (
+        "SHA256-Current: c 30\n"
+        "SHA256-History:\n a 10 T-1\n b 20 T-2\n"
+        "SHA256-Patches:\n p1 1 T-1\n p2 1 T-2\n"
+        "SHA256-Download:\n d1 1 T-1.gz\n d2 1 T-2.gz\n"
+    )
+
+    def test_patches_needed(self):
+        index = parse_pdiff_index(self.INDEX)
+        self.assertEqual(index.patches, {"T-1": "p1", "T-2": "p2"})
+        self.assertEqual(index.downloads["T-2.gz"], "d2")
+        self.assertEqual(patches_needed(index, "a"), ["T-1", "T-2"])
+        self.assertEqual(patches_needed(index, "b"), ["T-2"])
+        self.assertEqual(patches_needed(index, "c"), [])
+        self.assertIsNone(patches_needed(index, "z"))
+
+        merged = parse_pdiff_index("X-Patch-Precedence: merged\n" + self.INDEX)
+        self.assertEqual(patches_needed(merged, "a"), ["T-1"])
+
+    def test_apply_ed_patch(self):
+        old = b"".join(f"line {i}\n".encode() for i in range(20))
+        new = old.replace(b"line 3\n", b"").replace(b"line 7\n", b"seven\nmore\n") + b"tail\n"
+        lines = apply_ed_patch(old.splitlines(keepends=True), ed_script(old, new))
+        self.assertEqual(b"".join(lines), new)
+        with self.assertRaises(PatchError):
+            apply_ed_patch([b"a\n"], b"5d\n")
+        self.assertEqual(apply_ed_patch([b"a\n"], b"0a\nX\n.\n"), [b"X\n", b"a\n"])
+
+    def test_rejected_addresses(self):
+        for script in (b"0c\nX\n.\n", b"0d\n", b"0,1c\nX\n.\n", b"0,2d\n", b"4a\nX\n.\n", b"3,2d\n"):
+            with self.subTest(script=script), self.assertRaises(PatchError):
+                apply_ed_patch([b"a\n", b"b\n", b"c\n"], script)
+
+
+class TestDependencyGraph(unittest.TestCase):
+    def setUp(self):
+        self.graph = DependencyGraph.from_packages({
+            "app": PackageInfo("app", {"libssl3", "libc6"}),
+            "curl": PackageInfo("curl", {"libssl3"}),
+            "libssl3": PackageInfo("libssl3", {"libc6"}),
+        })
+
+    def test_dependencies(self):
+        self.assertEqual(self.graph.dependencies("app"), {"libssl3", "libc6"})
+        self.assertEqual(self.graph.dependencies("libc6"), set())
+        self.assertEqual(self.graph.dependencies("missing"), set())
+        self.assertTrue(self.graph.is_package("curl"))
+        self.assertFalse(self.graph.is_package("libc6"))
+        self.assertIn("libc6", self.graph)
+
+    def test_reverse_dependencies(self):
+        self.assertEqual(self.graph.reverse_dependencies("libssl3"), {"app", "curl"})
+        self.assertEqual(self.graph.reverse_dependencies("libc6"), {"app", "libssl3"})
+        self.assertEqual(self.graph.reverse_dependencies("app"), set())
+        libc6 = self.graph.id_of("libc6")
+        self.assertEqual(list(self.graph.reverse_dependency_ids(libc6)),
+                         sorted(self.graph.id_of(name) for name in ("app", "libssl3")))
+
+
+class TestReleaseStore(unittest.TestCase):
+    def setUp(self):
+        self.store = ReleaseStore()
+        self.store.add_release("jammy/amd64", {
+            "app": PackageInfo("app", {"libssl3", "libc6"}),
+            "curl": PackageInfo("curl", {"libssl3"}),
+            "libssl3": PackageInfo("libssl3", {"libc6"}),
+            "old": PackageInfo("old", {"libc6"}),
+        })
+        self.store.add_release("noble/amd64", {
+            "app": PackageInfo("app", {"libssl3", "libc6"}),
+            "curl": PackageInfo("curl", {"libssl3", "libzstd1"}),
+            "libssl3": PackageInfo("libssl3", {"libc6"}),
+            "libzstd1": PackageInfo("libzstd1", {"libc6"}),
+        })
+
+    def test_views(self):
+        jammy, noble = self.store["jammy/amd64"], self.store["noble/amd64"]
+        self.assertEqual(noble.dependencies("curl"), {"libssl3", "libzstd1"})
+        self.assertEqual(jammy.dependencies("curl"), {"libssl3"})
+        self.assertIn("old", jammy)
+        self.assertNotIn("old", noble)
+        self.assertEqual(len(noble), 4)
+        self.assertEqual(noble.reverse_dependencies("libc6"), {"app", "libssl3", "libzstd1"})
+        self.assertEqual(jammy.reverse_dependencies("libc6"), {"app", "libssl3", "old"})
+
+    def test_shared_storage(self):
+        # Names are interned once, the second release only keeps what changed
+        self.assertEqual(len(self.store.names), 6)
+        self.assertEqual(set(self.store["noble/amd64"].rows),
+                         {self.store.ids[name] for name in ("curl", "libzstd1", "old")})
+        # Identical dependency lists are one object
+        self.assertIs(self.store["jammy/amd64"].row(self.store.ids["libssl3"]),
+                      self.store["jammy/amd64"].row(self.store.ids["old"]))
+
+    def test_closure_diff(self):
+        self.assertEqual(self.store.closure_diff("curl", "jammy/amd64", "noble/amd64"),
+                         ({"libzstd1"}, set()))
+        self.assertEqual(self.store.closure_diff("curl", "jammy/amd64", "noble/amd64", depth=1),
+                         ({"libzstd1"}, set()))
+        self.assertEqual(self.store["noble/amd64"].closure("curl", 1), {"libssl3", "libzstd1"})
+        self.assertEqual(self.store.closure_diff("old", "jammy/amd64", "noble/amd64"), (set(), {"libc6"}))
+
 
 class TestDependencyAnalyzer(unittest.TestCase):
     def setUp(self):
@@ -71,6 +468,71 @@ class TestDependencyAnalyzer(unittest.TestCase):
         self.assertIn("pkg3", self.analyzer.dependencies)
         self.assertNotIn("pkg6", self.analyzer.dependencies)  # Limited by max_depth
 
+    @patch.object(RepositoryManager, 'get_package_dependencies')
+    def test_analyze_dependencies_shallowest_depth(self, mock_get_deps):
+        deps = {
+            "root": {"a", "c"},
+            "a": {"b"},
+            "b": {"c"},
+            "c": {"d"},
+            "d": {"e"}
+        }
+        mock_get_deps.side_effect = lambda package: deps.get(package, set())
+        self.analyzer.max_depth = 3
+
+        self.analyzer.analyze_dependencies("root")
+
+        # c is reached at depth 1 directly and at depth 3 through a and b
+        self.assertEqual(self.analyzer.depths["c"], 1)
+        self.assertIn("d", self.analyzer.dependencies)
+        self.assertEqual(self.analyzer.depths["e"], 3)
+        self.assertNotIn("e", self.analyzer.dependencies)
+        self.assertEqual(mock_get_deps.call_count, len(set(self.analyzer.dependencies)))
+
+    @patch.object(RepositoryManager, 'get_package_dependencies')
+    def test_analyze_dependencies_deep_chain(self, mock_get_deps):
+        mock_get_deps.side_effect = lambda package: {f"pkg{int(package[3:]) + 1}"}
+        self.analyzer.max_depth = 5000
+
+        self.analyzer.analyze_dependencies("pkg0")
+
+        self.assertEqual(len(self.analyzer.dependencies), 5000)
+        self.assertEqual(self.analyzer.depths["pkg5000"], 5000)
+
+    @patch.object(RepositoryManager, 'get_package_dependencies')
+    def test_analyze_batch_matches_single_analysis(self, mock_get_deps):
+        deps = {
+            "root": {"a", "c"},
+            "a": {"b"},
+            "b": {"c", "root"},
+            "c": {"d"},
+            "d": {"e"},
+            "other": {"c", "x"}
+        }
+        mock_get_deps.side_effect = lambda package: deps.get(package, set())
+        self.analyzer.max_depth = 3
+
+        results = {package: (dependencies, depths) for package, dependencies, depths
+                   in self.analyzer.analyze_batch(["root", "other"])}
+        # Every package is looked up once for the whole batch
+        self.assertEqual(mock_get_deps.call_count, len(self.analyzer.direct_cache))
+
+        for package in ("root", "other"):
+            single = DependencyAnalyzer(max_depth=3)
+            single.analyze_dependencies(package)
+            self.assertEqual(results[package], (single.dependencies, single.depths))
+
+    @patch.object(RepositoryManager, 'get_reverse_dependencies')
+    def test_analyze_reverse_dependencies(self, mock_get_rdeps):
+        rdeps = {"libssl3": {"curl", "app"}, "curl": {"git"}}
+        mock_get_rdeps.side_effect = lambda package: rdeps.get(package, set())
+        self.analyzer.reverse = True
+
+        self.analyzer.analyze_dependencies("libssl3")
+
+        self.assertEqual(self.analyzer.dependencies["libssl3"], {"curl", "app"})
+        self.assertEqual(self.analyzer.depths["git"], 2)
+
     def test_sanitize_node_id(self):
         test_cases = [
             ("simple-package", "simple_package"),
@@ -107,6 +569,91 @@ class TestDependencyAnalyzer(unittest.TestCase):
         self.assertIn("style pkg1 fill:#", mermaid)
 
 
+class TestQueryServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        analyzer = DependencyAnalyzer(max_depth=3)
+        analyzer.repo_manager.graph = DependencyGraph.from_packages({
+            "app": PackageInfo("app", {"libssl3", "libc6"}),
+            "curl": PackageInfo("curl", {"libssl3"}),
+            "libssl3": PackageInfo("libssl3", {"libc6"}),
+        })
+        self.server = await QueryServer(analyzer).start("127.0.0.1:0")
+        self.address = f"127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def ask(self, **request):
+        return await asyncio.to_thread(query, self.address, request)
+
+    async def test_queries(self):
+        self.assertEqual(await self.ask(op="deps", package="app"),
+                         {"ok": True, "result": ["libc6", "libssl3"]})
+        self.assertEqual((await self.ask(op="rdeps", package="libssl3"))["result"], ["app", "curl"])
+        self.assertEqual((await self.ask(op="closure", package="curl"))["result"], ["libc6", "libssl3"])
+        self.assertEqual((await self.ask(op="closure", package="curl", depth=1))["result"], ["libssl3"])
+        self.assertEqual((await self.ask(op="closure", package="libc6", reverse=True))["result"],
+                         ["app", "curl", "libssl3"])
+
+        graph = (await self.ask(op="graph", package="curl"))["result"]
+        self.assertIn("curl --> libssl3", graph)
+        self.assertIn("libssl3 --> libc6", graph)
+        graph = json.loads((await self.ask(op="graph", package="curl", format="json", depth=1))["result"])
+        self.assertEqual(graph["dependencies"], {"curl": ["libssl3"]})
+
+    async def test_bad_requests(self):
+        self.assertFalse((await self.ask(op="nope", package="app"))["ok"])
+        self.assertFalse((await self.ask(op="deps"))["ok"])
+        self.assertFalse((await self.ask(op="graph", package="app", format="png"))["ok"])
+        self.assertFalse((await self.ask(op="closure", package="app", depth=-1))["ok"])
+        self.assertFalse((await self.ask(op="closure", package="app", depth=10**6))["ok"])
+        self.assertEqual((await self.ask(op="closure", package="app", depth=0))["result"], [])
+
+        # One connection can carry many requests, errors don't close it
+        reader, writer = await asyncio.open_connection(*self.address.split(":"))
+        writer.write(b"not json\n" + json.dumps({"op": "deps", "package": "curl"}).encode() + b"\n")
+        await writer.drain()
+        self.assertFalse(json.loads(await reader.readline())["ok"])
+        self.assertEqual(json.loads(await reader.readline())["result"], ["libssl3"])
+        writer.close()
+        await writer.wait_closed()
+
+
+class TestEmitters(unittest.TestCase):
+    DEPENDENCIES = {
+        "pkg1": {"pkg2", "pkg3"},
+        "pkg2": {"pkg3", "pkg4"},
+        "pkg3": set()
+    }
+
+    def emit(self, format: str, dependencies=None) -> str:
+        stream = io.StringIO()
+        emit_graph(EMITTERS[format](stream), self.DEPENDENCIES if dependencies is None else dependencies)
+        return stream.getvalue()
+
+    def test_json(self):
+        graph = json.loads(self.emit("json"))
+        self.assertEqual(graph["root"], "pkg1")
+        self.assertEqual(graph["depths"], {"pkg1": 0, "pkg2": 1, "pkg3": 1, "pkg4": 2})
+        self.assertEqual(graph["dependencies"]["pkg2"], ["pkg3", "pkg4"])
+        self.assertEqual(json.loads(self.emit("json", {})), {"root": None, "depths": {}, "dependencies": {}})
+
+    def test_dot(self):
+        dot = self.emit("dot")
+        self.assertTrue(dot.startswith("digraph dependencies {"))
+        self.assertIn('"pkg1" -> "pkg2";', dot)
+        self.assertIn('"pkg4" [fillcolor="#ffcccc"];', dot)
+
+    def test_deep_graph_colors(self):
+        chain = {f"pkg{i}": {f"pkg{i + 1}"} for i in range(20)}
+        colors = re.findall(r"fill:(\S+)", self.emit("mermaid", chain))
+        self.assertEqual(len(colors), 21)
+        for color in colors:
+            self.assertRegex(color, r"^#[0-9a-f]{6}$")
+        self.assertEqual(colors[-1], "#ffffff")
+
+
 class TestDependencyVisualizer(unittest.TestCase):
     def setUp(self):
         self.visualizer = DependencyVisualizer("node_modules/.bin/mmdc")
@@ -117,10 +664,56 @@ class TestDependencyVisualizer(unittest.TestCase):
 
         with patch('tempfile.NamedTemporaryFile') as mock_temp:
             mock_temp.return_value.__enter__.return_value.name = "temp.mmd"
-            self.visualizer.visualize(mermaid_content)
+            image = self.visualizer.visualize(mermaid_content, "pkg1.svg")
 
             mock_run.assert_called_once()
-            self.assertEqual(mock_run.call_args[0][0], ["node_modules/.bin/mmdc", "-i", "temp.mmd"])
+            self.assertEqual(mock_run.call_args[0][0],
+                             ["node_modules/.bin/mmdc", "-i", "temp.mmd", "-o", "pkg1.svg"])
+            self.assertEqual(image, "pkg1.svg")
+
+    def fake_render(self, command, check):
+        """Stands in for mmdc: writes the input diagram as the output image."""
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.01)
+        with open(command[2]) as src, open(command[4], 'w') as dst:
+            dst.write(src.read())
+        with self.lock:
+            self.running -= 1
+
+    def setup_render(self):
+        self.lock = threading.Lock()
+        self.running = self.max_running = 0
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir)
+        return DependencyVisualizer("mmdc", cache_dir=os.path.join(self.work_dir, "cache"))
+
+    def test_render_cache(self):
+        visualizer = self.setup_render()
+        with patch('subprocess.run', side_effect=self.fake_render) as mock_run:
+            first = visualizer.render("graph LR\n    A --> B")
+            second = visualizer.render("graph LR\n    A --> B")
+            visualizer.render("graph LR\n    A --> C")
+
+        self.assertEqual(first, second)
+        self.assertEqual(mock_run.call_count, 2)
+        with open(first) as f:
+            self.assertEqual(f.read(), "graph LR\n    A --> B")
+        self.assertEqual(len(os.listdir(visualizer.cache_dir)), 2)
+
+    def test_visualize_many(self):
+        visualizer = self.setup_render()
+        contents = [f"graph LR\n    A --> N{i % 6}" for i in range(12)]
+        outputs = [os.path.join(self.work_dir, f"graph{i}.svg") for i in range(12)]
+        with patch('subprocess.run', side_effect=self.fake_render) as mock_run:
+            results = visualizer.visualize_many(contents, outputs, workers=3)
+
+        self.assertEqual(results, outputs)
+        self.assertEqual(mock_run.call_count, 6)
+        self.assertLessEqual(self.max_running, 3)
+        with open(outputs[7]) as f:
+            self.assertEqual(f.read(), contents[7])
 
 
 if __name__ == '__main__':
@@ -13,10 +13,8 @@ def parse_args():
 def main():
     args = parse_args()
 
-    input_data = sys.stdin.read()
-
     cli_handler = CLIHandler()
-    cli_handler.process(input_data, args.output_file)
+    cli_handler.process_stream(sys.stdin.buffer, args.output_file)
 
 
 if __name__ == "__main__":
@@ -25,3 +25,17 @@ class CLIHandler:
             print(f"Синтаксическая ошибка: {traceback.format_exc()}")
         except Exception:
             print(f"Ошибка: {traceback.format_exc()}")
+
+    def process_stream(self, input_stream, output_file):
+        """
+        Преобразует XML из бинарного потока, не загружая документ целиком:
+        память ограничена размером одного дочернего элемента корня.
+        """
+        try:
+            self.generator.generate_stream(self.parser.iterparse(input_stream), output_file)
+
+            print(f"Конфигурация успешно записана в файл {output_file}")
+        except SyntaxError:
+            print(f"Синтаксическая ошибка: {traceback.format_exc()}")
+        except Exception:
+            print(f"Ошибка: {traceback.format_exc()}")
@@ -1,4 +1,7 @@
 import re
+import tempfile
+from array import array
+from xml.etree.ElementTree import Comment
 
 
 class ConfigGenerator:
@@ -10,38 +13,112 @@ class ConfigGenerator:
             'concat': lambda *args: ''.join(map(str, args)),
         }
 
+    def serialize(self, value):
+        """
+        Преобразует значение (словарь, список, строку или число) в текст конфигурации.
+        """
+        if isinstance(value, dict):
+            return f"table([{', '.join(f'{k} = {self.serialize(v)}' for k, v in value.items())}])"
+        elif isinstance(value, list):
+            return f"array({', '.join(self.serialize(v) for v in value)})"
+        elif isinstance(value, str):
+            if value.startswith('^{') and value.endswith('}'):
+                return self._evaluate_expression(value[2:-1])
+            return f'"{value}"'
+        elif isinstance(value, (int, float)):
+            return str(value)
+        else:
+            raise ValueError(f"Неизвестный тип данных: {type(value)}")
+
+    def _format_comment(self, comment):
+        if "\n" in comment:
+            return f"/*\n{comment}\n*/"
+        return f"# {comment}"
+
     def generate(self, data, comments=None):
         """
         Генерирует конфигурацию, включая комментарии.
         """
-        def serialize(value):
-            if isinstance(value, dict):
-                return f"table([{', '.join(f'{k} = {serialize(v)}' for k, v in value.items())}])"
-            elif isinstance(value, list):
-                return f"array({', '.join(serialize(v) for v in value)})"
-            elif isinstance(value, str):
-                if value.startswith('^{') and value.endswith('}'):
-                    return self._evaluate_expression(value[2:-1])
-                return f'"{value}"'
-            elif isinstance(value, (int, float)):
-                return str(value)
-            else:
-                raise ValueError(f"Неизвестный тип данных: {type(value)}")
-
         result = []
 
         # Добавляем комментарии
         if comments:
             for comment in comments:
-                if "\n" in comment:
-                    result.append(f"/*\n{comment}\n*/")
-                else:
-                    result.append(f"# {comment}")
+                result.append(self._format_comment(comment))
 
         for key, value in data.items():
-            result.append(f"global {key} = {serialize(value)};")
+            result.append(f"global {key} = {self.serialize(value)};")
         return "\n".join(result)
 
+    def generate_stream(self, events, output_file):
+        """
+        Потоковый вариант generate: записывает в output_file тот же текст,
+        что generate для документа, разобранного целиком, по событиям
+        XMLParser.iterparse.
+
+        Значения дочерних элементов корня сериализуются по мере разбора во
+        временный файл, в памяти остаются только их ключи и смещения.
+        Комментарии в выводе идут первыми, а таблица или массив получается
+        из корня, только когда известны все его дочерние элементы, поэтому
+        итоговый файл собирается в конце. Файл открывается только после
+        успешного разбора, как и в process.
+        """
+        root_comments = []
+        nested_comments = []
+        keys = []
+        # Границы значений во временном файле
+        offsets = array('Q', [0])
+        first_group = None
+        mixed = False
+        root = root_text = None
+
+        with tempfile.TemporaryFile() as values:
+            for event in events:
+                kind = event[0]
+                if kind == "root":
+                    root = event[1]
+                elif kind == "child":
+                    _, key, group, value, comments = event
+                    if not keys:
+                        first_group = group
+                    elif group != first_group:
+                        mixed = True
+                    keys.append(key)
+                    if group is Comment:
+                        root_comments.append(value)
+                    nested_comments.extend(comments)
+                    values.write(self.serialize(value).encode('utf-8'))
+                    offsets.append(values.tell())
+                else:
+                    root_text = event[1]
+
+            def value_at(i):
+                values.seek(offsets[i])
+                return values.read(offsets[i + 1] - offsets[i]).decode('utf-8')
+
+            with open(output_file, "w") as f:
+                for comment in root_comments + nested_comments:
+                    f.write(self._format_comment(comment) + "\n")
+                f.write(f"global {root} = ")
+                if not keys:
+                    f.write(self.serialize(root_text))
+                elif not mixed and len(keys) != 1:
+                    # Все дочерние элементы с одним тегом образуют массив
+                    f.write("array(")
+                    for i in range(len(keys)):
+                        f.write((", " if i else "") + value_at(i))
+                    f.write(")")
+                else:
+                    # Как в словаре: повторный ключ остаётся на первом месте с последним значением
+                    last = {}
+                    for i, key in enumerate(keys):
+                        last[key] = i
+                    f.write("table([")
+                    for n, (key, i) in enumerate(last.items()):
+                        f.write(f"{', ' if n else ''}{key} = {value_at(i)}")
+                    f.write("])")
+                f.write(";")
+
 
     def _evaluate_expression(self, expr):
         """
@@ -2,10 +2,91 @@ from xml.etree.ElementTree import ElementTree, fromstring, Comment
 from xml.etree.ElementTree import XMLParser as XML
 from src.commented_tb import CommentedTreeBuilder
 
+# Размер блока, которым читается входной поток в iterparse
+CHUNK_SIZE = 1 << 16
+
+
+class TopLevelTreeBuilder:
+    """
+    Цель для XMLParser, которая строит дерево только текущего дочернего
+    элемента корня. Готовые элементы складываются в ready и больше не
+    связаны с корнем, поэтому освобождаются, как только их заберут.
+    """
+    def __init__(self):
+        self.depth = 0
+        self.builder = None
+        self.ready = []
+        self.root_text = []
+        self.has_children = False
+
+    def start(self, tag, attrs):
+        self.depth += 1
+        if self.depth == 1:
+            self.ready.append(("root", tag))
+            return
+        if self.depth == 2:
+            self.builder = CommentedTreeBuilder()
+            self.has_children = True
+        self.builder.start(tag, attrs)
+
+    def end(self, tag):
+        self.depth -= 1
+        if self.depth >= 1:
+            self.builder.end(tag)
+            if self.depth == 1:
+                self.ready.append(("element", self.builder.close()))
+                self.builder = None
+
+    def data(self, data):
+        if self.depth == 1:
+            # Текст корня нужен, только если у него нет дочерних элементов
+            if not self.has_children:
+                self.root_text.append(data)
+        elif self.depth > 1:
+            self.builder.data(data)
+
+    def comment(self, data):
+        if self.depth == 1:
+            builder = CommentedTreeBuilder()
+            builder.comment(data)
+            self.ready.append(("element", builder.close()))
+            self.has_children = True
+        elif self.depth > 1:
+            self.builder.comment(data)
+
+    def close(self):
+        return None
+
+
 class XMLParser:
     """
     Класс для парсинга XML в словарь Python.
     """
+    def parse_element(self, element, comments):
+        """
+        Преобразует элемент в строку, список или словарь, добавляя
+        комментарии из поддерева в comments.
+        """
+        for item in element:
+            if item.tag is Comment:
+                comments.append(item.text.strip())
+        if len(element) == 0:
+            return element.text.strip() if element.text else ""
+        elif len(set(child.tag for child in element)) == 1 and len(tuple(child.tag for child in element)) != 1:
+            return [self.parse_element(child, comments) for child in element]
+        else:
+            result = {}
+            comments_count = 0
+            for child in element:
+                element_tag = ''
+                if child.tag is Comment:
+                    element_tag = f'comment_{comments_count}'
+                    comments_count += 1
+                else:
+                    element_tag = child.tag
+                result[element_tag] = self.parse_element(child, comments)
+            return result
+
     def parse(self, xml_data):
         """
         Преобразует XML-данные в словарь и собирает комментарии.
@@ -16,27 +97,41 @@ class XMLParser:
         data = {}
         comments = []
 
-        def parse_element(element):
-            for item in element:
-                if item.tag is Comment:
-                    comments.append(item.text.strip())
-            print(element.tag)
-            if len(element) == 0:
-                return element.text.strip() if element.text else ""
-            elif len(set(child.tag for child in element)) == 1 and len(tuple(child.tag for child in element)) != 1:
-                return [parse_element(child) for child in element]
-            else:
-                result = {}
-                comments_count = 0
-                for child in element:
-                    element_tag = ''
-                    if child.tag is Comment:
-                        element_tag = f'comment_{comments_count}'
-                        comments_count += 1
-                    else:
-                        element_tag = child.tag
-                    result[element_tag] = parse_element(child)
-                return result
-
-        data[tree.getroot().tag] = parse_element(tree.getroot())
+        data[tree.getroot().tag] = self.parse_element(tree.getroot(), comments)
         return data, comments
+
+    def iterparse(self, stream, chunk_size=CHUNK_SIZE):
+        """
+        Потоково разбирает XML из бинарного потока. Возвращает события:
+        ("root", тег корня), затем ("child", ключ, тег, значение, комментарии)
+        для каждого завершённого дочернего элемента корня и в конце
+        ("end", текст корня). В памяти одновременно находится только
+        один дочерний элемент корня.
+        """
+        target = TopLevelTreeBuilder()
+        parser = XML(target=target)
+        comments_count = 0
+
+        def events():
+            nonlocal comments_count
+            for kind, item in target.ready:
+                if kind == "root":
+                    yield kind, item
+                    continue
+                comments = []
+                value = self.parse_element(item, comments)
+                if item.tag is Comment:
+                    key = f'comment_{comments_count}'
+                    comments_count += 1
+                else:
+                    key = item.tag
+                yield "child", key, item.tag, value, comments
+            target.ready.clear()
+
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            parser.feed(chunk)
+            yield from events()
+        parser.close()
+        yield from events()
+        root_text = "".join(target.root_text)
+        yield "end", root_text.strip() if root_text else ""
@@ -1,4 +1,9 @@
+import io
+import os
+import shutil
+import tempfile
 import unittest
+from src.cli_handler import CLIHandler
 from src.config_generator import ConfigGenerator
 from src.xml_parser import XMLParser
 
@@ -68,5 +73,65 @@ class TestConfigGenerator(unittest.TestCase):
         self.assertEqual(result, expected)
 
 
+class TestStreaming(unittest.TestCase):
+    DOCUMENTS = [
+        "<config><name>Test</name><version>1.0</version></config>",
+        "<root><settings><option1>true</option1><option2>false</option2></settings></root>",
+        "<root>только текст</root>",
+        "<root><item>1</item><item>2</item><item><a>x</a><a>y</a></item></root>",
+        "<root><only>один</only></root>",
+        "<root><a>1</a><b>2</b><a>3</a></root>",
+        "<root><sum>^{5 + 10}</sum><name>^{concat(\"a\", \"b\")}</name></root>",
+        """<?xml version="1.0"?>
+        <root>
+            <server><!-- Вложенный -->
+                <host>localhost</host>
+            </server>
+            <!-- Комментарий
+            на двух строках -->
+            <port>8080</port>
+        </root>
+        """,
+        "<root><!-- первый --><!-- второй --></root>",
+    ]
+
+    def setUp(self):
+        self.handler = CLIHandler()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def convert(self, xml, stream):
+        path = os.path.join(self.directory, "stream.conf" if stream else "whole.conf")
+        if stream:
+            self.handler.parser = XMLParser()
+            events = self.handler.parser.iterparse(io.BytesIO(xml.encode("utf-8")), chunk_size=7)
+            self.handler.generator.generate_stream(events, path)
+        else:
+            self.handler.process(xml, path)
+        with open(path) as f:
+            return f.read()
+
+    def test_stream_matches_whole_document(self):
+        for xml in self.DOCUMENTS:
+            with self.subTest(xml=xml):
+                self.assertEqual(self.convert(xml, stream=True), self.convert(xml, stream=False))
+
+    def test_iterparse_events(self):
+        events = list(XMLParser().iterparse(io.BytesIO(b"<root><a><b>1</b></a><c>2</c></root>")))
+        self.assertEqual(events, [
+            ("root", "root"),
+            ("child", "a", "a", {"b": "1"}, []),
+            ("child", "c", "c", "2", []),
+            ("end", ""),
+        ])
+
+    def test_syntax_error_leaves_no_output(self):
+        path = os.path.join(self.directory, "broken.conf")
+        self.handler.process_stream(io.BytesIO(b"<root><a>1</a>"), path)
+        self.assertFalse(os.path.exists(path))
+
+
 if __name__ == "__main__":
     unittest.main()